@@ -94,23 +94,29 @@ WSGI_APPLICATION = "services.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-# DATABASES = {
-#     "default": {
-#         "ENGINE": "django.db.backends.sqlite3",
-#         "NAME": BASE_DIR / "db.sqlite3",
-#     }
-# }
-
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
-        "NAME": "postgres",
-        "USER": "postgres",
-        "PASSWORD": "1",
-        "HOST": "localhost",
-        "PORT": "5432",
+# DATABASE_ENGINE=django.db.backends.sqlite3 runs everything, translation
+# jobs included, on a local file instead of PostgreSQL. Use PostgreSQL to run
+# translation workers on several nodes.
+if os.getenv("DATABASE_ENGINE") == "django.db.backends.sqlite3":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("DATABASE_NAME") or BASE_DIR / "db.sqlite3",
+            # Seconds to wait for the lock of the file when workers write concurrently
+            "OPTIONS": {"timeout": 20},
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql_psycopg2",
+            "NAME": os.getenv("DATABASE_NAME") or "postgres",
+            "USER": os.getenv("DATABASE_USER") or "postgres",
+            "PASSWORD": os.getenv("DATABASE_PASSWORD") or "1",
+            "HOST": os.getenv("DATABASE_HOST") or "localhost",
+            "PORT": os.getenv("DATABASE_PORT") or "5432",
+        }
     }
-}
 
 
 # Password validation
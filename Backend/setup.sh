@@ -14,4 +14,8 @@ fi
 python3 -m pip install -e ../.
 python3 manage.py makemigrations account translation
 python3 manage.py migrate
+# Load the models once, in a process shared by the web workers
+python3 -m Model.server &
+# Translation jobs queued by the web workers, add workers to translate more PDFs at once
+python3 manage.py translation_worker &
 python3 manage.py runserver 0.0.0.0:8000
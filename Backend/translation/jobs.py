@@ -0,0 +1,326 @@
+import os
+import socket
+import threading
+import time
+import traceback
+import urllib.request
+from contextlib import nullcontext
+from datetime import timedelta
+
+import firebase_admin
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from firebase_admin import credentials, initialize_app, storage
+
+from Model.client import TranslationClient
+from translation.models import PDF, Translation, TranslationJob
+
+pdf_folder = os.path.join(settings.MEDIA_ROOT, "PDFs")
+
+
+def default_worker_id():
+    """
+    Identifies a worker process across the nodes: hostname and pid.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def input_names(file_input, language):
+    """
+    Computes the file names of a translation, as uploaded by CreatePDF.
+
+    Args:
+        file_input (PDF): The PDF to translate.
+        language (str): The target language.
+
+    Returns:
+        tuple: Local input name, local output name and output name shown to the user.
+    """
+    # get the random number of file
+    random_number = str(file_input.file).split("/")[-1].split("_")[-1].split(".")[0]
+    base_name = str(file_input.file_name).split(".")[0]
+    input_name = base_name + "_" + random_number + ".pdf"
+    random_output_name = base_name + "_" + random_number + "_translated_" + str(language) + ".pdf"
+    output_name = base_name + "_translated_" + str(language) + ".pdf"
+    return input_name, random_output_name, output_name
+
+
+def enqueue_translation(file_input, language):
+    """
+    Creates a pending translation (status 0) of a PDF and queues its job.
+
+    Args:
+        file_input (PDF): The PDF to translate.
+        language (str): The target language.
+
+    Returns:
+        Translation: The created translation, without file output yet.
+    """
+    with transaction.atomic():
+        translation = Translation.objects.create(status=0, file_input=file_input, file_output=None)
+        TranslationJob.objects.create(
+            translation=translation,
+            language=language,
+            max_attempts=int(os.getenv("TRANSLATION_JOB_MAX_ATTEMPTS") or 3),
+        )
+    return translation
+
+
+def claim_job(worker_id, lease_seconds):
+    """
+    Leases the oldest available job to a worker.
+
+    A job is available when it is queued and due, or when it is running with
+    an expired lease, i.e. its worker died. On PostgreSQL the candidate row
+    is locked with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers
+    pick different jobs without waiting for each other. The lease is then
+    taken with a conditional UPDATE on the state and attempts read, which
+    also keeps the claim exclusive on SQLite, where FOR UPDATE is ignored.
+
+    Args:
+        worker_id (str): The ID of the worker.
+        lease_seconds (float): Duration of the lease.
+
+    Returns:
+        TranslationJob: The leased job, or None if no job is available.
+    """
+    now = timezone.now()
+    # SQLite has no row locks, and upgrading its read transaction to a write
+    # one fails under concurrency: the conditional UPDATE is enough there
+    atomic = transaction.atomic() if connection.features.has_select_for_update else nullcontext()
+    with atomic:
+        job = (
+            TranslationJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(state=TranslationJob.QUEUED, available_at__lte=now)
+                | Q(state=TranslationJob.RUNNING, lease_expires_at__lt=now),
+                attempts__lt=F("max_attempts"),
+            )
+            .order_by("available_at", "job_id")
+            .first()
+        )
+        if job is None:
+            return None
+        claimed = TranslationJob.objects.filter(
+            job_id=job.job_id, state=job.state, attempts=job.attempts
+        ).update(
+            state=TranslationJob.RUNNING,
+            attempts=job.attempts + 1,
+            leased_by=worker_id,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            heartbeat_at=now,
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def fail_expired_jobs():
+    """
+    Fails the running jobs whose lease expired on their last attempt.
+
+    Returns:
+        int: The number of failed jobs.
+    """
+    now = timezone.now()
+    failed = 0
+    expired = TranslationJob.objects.filter(
+        state=TranslationJob.RUNNING, lease_expires_at__lt=now, attempts__gte=F("max_attempts")
+    )
+    for job in expired:
+        with transaction.atomic():
+            if TranslationJob.objects.filter(job_id=job.job_id, state=TranslationJob.RUNNING, attempts=job.attempts).update(
+                state=TranslationJob.FAILED, last_error="Lease expired on the last attempt"
+            ):
+                Translation.objects.filter(translation_id=job.translation_id).update(status=-1)
+                failed += 1
+    return failed
+
+
+def _owned(job):
+    """
+    Running jobs of the same worker and attempt as job, i.e. job while its lease is held.
+    """
+    return TranslationJob.objects.filter(
+        job_id=job.job_id, state=TranslationJob.RUNNING, leased_by=job.leased_by, attempts=job.attempts
+    )
+
+
+class Heartbeat(threading.Thread):
+    """
+    Extends the lease of a job every interval seconds while it is processed.
+
+    lost is set when the lease could not be extended because another worker
+    took the job over.
+    """
+
+    def __init__(self, job, lease_seconds, interval):
+        super().__init__(daemon=True)
+        self.job = job
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                now = timezone.now()
+                if not _owned(self.job).update(
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds), heartbeat_at=now
+                ):
+                    self.lost.set()
+                    return
+        finally:
+            # Threads get their own database connection
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def _bucket():
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(settings.CREDENTIAL_JSON)
+        initialize_app(cred, {"storageBucket": settings.STORAGE_BUCKET})
+    return storage.bucket()
+
+
+def run_job(job, client, lease_seconds):
+    """
+    Translates the PDF of a leased job and publishes the result.
+
+    The input PDF is downloaded from its public URL when the worker runs on
+    another node than the web server that received it.
+
+    Args:
+        job (TranslationJob): A job leased by claim_job.
+        client (TranslationClient): Client of the model server of the node.
+        lease_seconds (float): Duration of the lease, extended every third of it.
+
+    Returns:
+        bool: True if the job is done, False if the lease was lost meanwhile.
+    """
+    translation = job.translation
+    file_input = translation.file_input
+    input_name, random_output_name, output_name = input_names(file_input, job.language)
+    file_name_input = os.path.join(pdf_folder, input_name)
+    file_name_output = os.path.join(pdf_folder, random_output_name)
+    os.makedirs(pdf_folder, exist_ok=True)
+    if not os.path.exists(file_name_input):
+        urllib.request.urlretrieve(file_input.getFileUrl(), file_name_input)
+
+    heartbeat = Heartbeat(job, lease_seconds, lease_seconds / 3)
+    heartbeat.start()
+    try:
+        client.translate_pdf(
+            language=job.language,
+            input_path=file_name_input,
+            output_file=file_name_output,
+        )
+    finally:
+        heartbeat.stop()
+    if heartbeat.lost.is_set():
+        return False
+
+    blob = _bucket().blob(random_output_name)
+    blob.upload_from_filename(file_name_output)
+    # make public access from the URL
+    blob.make_public()
+
+    with transaction.atomic():
+        if not _owned(job).select_for_update().exists():
+            return False
+        new_pdf = PDF(
+            owner_id=file_input.owner_id,
+            file=blob.public_url,
+            language=job.language,
+            file_name=output_name,
+        )
+        new_pdf.save()
+        translation.file_output = new_pdf
+        translation.status = 1
+        translation.save_update()
+        _owned(job).update(state=TranslationJob.DONE, lease_expires_at=None, last_error="")
+
+    # delete original pdf and output pdf just saved from pdf folder
+    for path in [file_name_input, file_name_output]:
+        if os.path.exists(path):
+            os.remove(path)
+    return True
+
+
+def fail_job(job, error, retry_delay):
+    """
+    Requeues a job after an error, or fails it on its last attempt.
+
+    The retry is delayed by retry_delay * 2 ** (attempts - 1) seconds.
+
+    Args:
+        job (TranslationJob): The leased job.
+        error (str): Description of the error.
+        retry_delay (float): Delay before the first retry.
+
+    Returns:
+        bool: True if the job will be retried.
+    """
+    with transaction.atomic():
+        if job.attempts >= job.max_attempts:
+            if _owned(job).update(state=TranslationJob.FAILED, lease_expires_at=None, last_error=error):
+                Translation.objects.filter(translation_id=job.translation_id).update(status=-1)
+            return False
+        _owned(job).update(
+            state=TranslationJob.QUEUED,
+            available_at=timezone.now() + timedelta(seconds=retry_delay * 2 ** (job.attempts - 1)),
+            leased_by="",
+            lease_expires_at=None,
+            last_error=error,
+        )
+    return True
+
+
+def work(worker_id=None, lease_seconds=60.0, poll_interval=2.0, retry_delay=30.0, once=False):
+    """
+    Processes the queued translation jobs until interrupted.
+
+    Any number of workers can run this loop, on any number of nodes sharing
+    the database, each with a model server on its node.
+
+    Args:
+        worker_id (str, optional): The ID of the worker. Defaults to hostname:pid.
+        lease_seconds (float): Duration of the lease of a job.
+        poll_interval (float): Seconds to wait when no job is available.
+        retry_delay (float): Delay before the first retry of a failed job.
+        once (bool): Stop when no job is available instead of waiting.
+
+    Returns:
+        dict: Number of done, retried, failed and lost jobs.
+    """
+    worker_id = worker_id or default_worker_id()
+    client = TranslationClient()
+    stats = {"done": 0, "retried": 0, "failed": 0, "lost": 0}
+    while True:
+        stats["failed"] += fail_expired_jobs()
+        job = claim_job(worker_id, lease_seconds)
+        if job is None:
+            if once:
+                return stats
+            time.sleep(poll_interval)
+            continue
+        print(f"Worker {worker_id}: job {job.job_id}, attempt {job.attempts}/{job.max_attempts}")
+        try:
+            if run_job(job, client, lease_seconds):
+                stats["done"] += 1
+            else:
+                print(f"Worker {worker_id}: lost the lease of job {job.job_id}")
+                stats["lost"] += 1
+        except Exception as e:
+            traceback.print_exc()
+            if fail_job(job, str(e), retry_delay):
+                stats["retried"] += 1
+            else:
+                stats["failed"] += 1
@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from translation.jobs import default_worker_id, work
+
+
+class Command(BaseCommand):
+    help = "Process the queued translation jobs. Run one or more per node."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--worker-id", default=default_worker_id())
+        parser.add_argument(
+            "--lease-seconds",
+            type=float,
+            default=float(os.getenv("TRANSLATION_JOB_LEASE_SECONDS") or 60),
+            help="A job whose worker did not heartbeat for this long is taken over by another worker.",
+        )
+        parser.add_argument("--poll-interval", type=float, default=2.0)
+        parser.add_argument(
+            "--retry-delay",
+            type=float,
+            default=float(os.getenv("TRANSLATION_JOB_RETRY_DELAY") or 30),
+            help="Seconds before the first retry of a failed job, doubled at each attempt.",
+        )
+        parser.add_argument("--once", action="store_true", help="Stop when the queue is empty.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Translation worker {options['worker_id']} started")
+        stats = work(
+            worker_id=options["worker_id"],
+            lease_seconds=options["lease_seconds"],
+            poll_interval=options["poll_interval"],
+            retry_delay=options["retry_delay"],
+            once=options["once"],
+        )
+        self.stdout.write(f"Translation worker {options['worker_id']} stopped: {stats}")
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from account.models import User
 
 
@@ -89,8 +90,9 @@ class Translation(models.Model):
     file_input = models.ForeignKey(
         PDF, related_name="file_input", on_delete=models.CASCADE
     )
+    # Null until the translation job has produced the output PDF
     file_output = models.ForeignKey(
-        PDF, related_name="output", on_delete=models.CASCADE
+        PDF, related_name="output", on_delete=models.CASCADE, null=True, blank=True
     )
     time_stamp = models.DateTimeField(auto_now=True)
 
@@ -107,7 +109,7 @@ class Translation(models.Model):
         """
         Get the file output name.
         """
-        return str(self.file_output)
+        return str(self.file_output) if self.file_output else None
 
     def getFileInput(self):
         """
@@ -133,7 +135,7 @@ class Translation(models.Model):
         """
         return (
             str(self.file_input),
-            str(self.file_output),
+            str(self.file_output) if self.file_output else None,
             self.file_input.getOwner(),
             self.status,
         )
@@ -148,7 +150,7 @@ class Translation(models.Model):
         """
         Saves the current object and updates the database.
         """
-        super(PDF, self).save()
+        super(Translation, self).save()
 
     def updateStatus(self, new_status):
         """
@@ -177,6 +179,42 @@ class Translation(models.Model):
         self.save_update()
 
 
+class TranslationJob(models.Model):
+    """
+    Queued translation of a Translation, processed by the translation_worker
+    management command.
+
+    A worker owns a running job until lease_expires_at and keeps extending
+    the lease while it works. A job whose lease expired (dead worker) is
+    claimed again by another worker, until max_attempts is reached.
+    """
+    QUEUED = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = -1
+
+    job_id = models.AutoField(primary_key=True)
+    translation = models.OneToOneField(
+        Translation, related_name="job", on_delete=models.CASCADE
+    )
+    language = models.CharField(max_length=2)
+    state = models.IntegerField(default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    available_at = models.DateTimeField(default=timezone.now)
+    leased_by = models.CharField(max_length=255, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["state", "available_at"])]
+
+    def __str__(self):
+        return str(self.job_id) + " " + str(self.state)
+
+
 class Feedback(models.Model):
     feedback_id = models.AutoField(primary_key=True)
     user_id = models.ForeignKey(
@@ -1,3 +1,158 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from account.models import Profile, User
+from translation.jobs import _owned, claim_job, enqueue_translation, fail_expired_jobs, fail_job
+from translation.models import PDF, Translation, TranslationJob
+
+
+def create_jobs(count, max_attempts=3):
+    """
+    Creates a user with count PDFs, each with a queued translation job.
+    """
+    profile = Profile.objects.create(full_name="Test User")
+    user = User.objects.create(username="test", email="test@example.com", password="secret", profile=profile)
+    jobs = []
+    for i in range(count):
+        pdf = PDF.objects.create(owner_id=user, file=f"https://example.com/paper_{i}.pdf", file_name="paper.pdf")
+        translation = enqueue_translation(pdf, "vi")
+        TranslationJob.objects.filter(translation=translation).update(max_attempts=max_attempts)
+        jobs.append(translation.job)
+    return jobs
+
+
+def make_due(job):
+    """
+    Makes a job available now, as if its retry delay had passed.
+    """
+    TranslationJob.objects.filter(job_id=job.job_id).update(available_at=timezone.now() - timedelta(seconds=1))
+
+
+def expire_lease(job):
+    """
+    Expires the lease of a running job, as if its worker stopped sending heartbeats.
+    """
+    TranslationJob.objects.filter(job_id=job.job_id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+
+class ClaimJobTests(TestCase):
+    def test_workers_claim_different_jobs(self):
+        create_jobs(2)
+        first = claim_job("worker-a", 60)
+        second = claim_job("worker-b", 60)
+        self.assertNotEqual(first.job_id, second.job_id)
+        self.assertEqual((first.state, first.attempts, first.leased_by), (TranslationJob.RUNNING, 1, "worker-a"))
+        self.assertEqual((second.state, second.attempts, second.leased_by), (TranslationJob.RUNNING, 1, "worker-b"))
+        self.assertIsNone(claim_job("worker-c", 60))
+
+    def test_running_job_is_not_claimed_before_its_lease_expires(self):
+        create_jobs(1)
+        claim_job("worker-a", 60)
+        self.assertIsNone(claim_job("worker-b", 60))
+
+    def test_expired_lease_is_taken_over(self):
+        create_jobs(1)
+        job = claim_job("worker-a", 60)
+        expire_lease(job)
+
+        taken = claim_job("worker-b", 60)
+        self.assertEqual(taken.job_id, job.job_id)
+        self.assertEqual((taken.state, taken.attempts, taken.leased_by), (TranslationJob.RUNNING, 2, "worker-b"))
+        # The first worker has lost the job: its heartbeats and its result no longer apply
+        self.assertFalse(_owned(job).exists())
+        self.assertTrue(_owned(taken).exists())
+
+    def test_expired_lease_on_last_attempt_fails_the_job(self):
+        create_jobs(1, max_attempts=1)
+        job = claim_job("worker-a", 60)
+        expire_lease(job)
+
+        self.assertIsNone(claim_job("worker-b", 60))
+        self.assertEqual(fail_expired_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.state, TranslationJob.FAILED)
+        self.assertEqual(Translation.objects.get(translation_id=job.translation_id).status, -1)
+
+
+class FailJobTests(TestCase):
+    def test_retry_with_backoff(self):
+        create_jobs(1)
+        job = claim_job("worker-a", 60)
+        before = timezone.now()
+        self.assertTrue(fail_job(job, "first error", retry_delay=10))
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.leased_by, job.last_error), (TranslationJob.QUEUED, "", "first error"))
+        self.assertGreaterEqual(job.available_at, before + timedelta(seconds=10))
+        self.assertLess(job.available_at, timezone.now() + timedelta(seconds=11))
+        # Not due yet
+        self.assertIsNone(claim_job("worker-b", 60))
+
+        make_due(job)
+        job = claim_job("worker-b", 60)
+        self.assertEqual(job.attempts, 2)
+        before = timezone.now()
+        self.assertTrue(fail_job(job, "second error", retry_delay=10))
+        job.refresh_from_db()
+        # The delay doubles with every attempt
+        self.assertGreaterEqual(job.available_at, before + timedelta(seconds=20))
+        self.assertLess(job.available_at, timezone.now() + timedelta(seconds=21))
+        self.assertEqual(Translation.objects.get(translation_id=job.translation_id).status, 0)
+
+    def test_failed_after_max_attempts(self):
+        create_jobs(1, max_attempts=2)
+        job = claim_job("worker-a", 60)
+        self.assertTrue(fail_job(job, "first error", retry_delay=10))
+        make_due(job)
+        job = claim_job("worker-a", 60)
+        self.assertFalse(fail_job(job, "second error", retry_delay=10))
+
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.attempts, job.last_error), (TranslationJob.FAILED, 2, "second error"))
+        self.assertEqual(Translation.objects.get(translation_id=job.translation_id).status, -1)
+        make_due(job)
+        self.assertIsNone(claim_job("worker-a", 60))
+
+    def test_lost_job_is_not_requeued(self):
+        create_jobs(1)
+        job = claim_job("worker-a", 60)
+        expire_lease(job)
+        taken = claim_job("worker-b", 60)
+
+        # The first worker fails after the takeover, the job stays with the second one
+        fail_job(job, "late error", retry_delay=10)
+        taken.refresh_from_db()
+        self.assertEqual((taken.state, taken.leased_by, taken.last_error), (TranslationJob.RUNNING, "worker-b", ""))
+
+
+class ConcurrentClaimTests(TransactionTestCase):
+    def test_concurrent_workers_never_claim_the_same_job(self):
+        jobs = create_jobs(20)
+        claimed = []
+        lock = threading.Lock()
+
+        def worker(worker_id):
+            try:
+                while True:
+                    job = claim_job(worker_id, 60)
+                    if job is None:
+                        # A lost race also returns None, stop only once nothing is queued
+                        if not TranslationJob.objects.filter(state=TranslationJob.QUEUED).exists():
+                            return
+                        continue
+                    with lock:
+                        claimed.append(job.job_id)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(f"worker-{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(claimed), sorted(job.job_id for job in jobs))
+        self.assertFalse(TranslationJob.objects.exclude(attempts=1).exists())
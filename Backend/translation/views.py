@@ -6,14 +6,13 @@ from rest_framework.permissions import AllowAny
 from rest_framework import status
 from account.models import User, Profile
 from translation.models import PDF, Translation, Feedback
+from translation.jobs import enqueue_translation
 from translation.serializers import (
     PDFSerializer,
     TranslationSerializer,
     FeedbackSerializer,
 )
 
-import shutil
-
 
 # from django.views.decorators.csrf import csrf_exempt
 from rest_framework.parsers import JSONParser
@@ -22,8 +21,6 @@ import firebase_admin
 from dotenv import load_dotenv
 from django.conf import settings
 
-from Model.main import TranslationLayoutRecovery
-
 # Load the environment variables from the .env file
 load_dotenv()
 
@@ -32,8 +29,6 @@ storage_bucket = settings.STORAGE_BUCKET
 avatar_folder = os.path.join(settings.MEDIA_ROOT, "Avatars")
 pdf_folder = os.path.join(settings.MEDIA_ROOT, "PDFs")
 
-obj = TranslationLayoutRecovery()
-
 # Init firebase with your credentials
 if not firebase_admin._apps:
     cred = credentials.Certificate(credential_json)
@@ -270,75 +265,14 @@ class ProcessTranslation(APIView):
             if PDF.objects.filter(pdf_id=translation_data["file_input"]).exists():
                 file_input = PDF.objects.get(pdf_id=translation_data["file_input"])
 
-                # get the random number of file
-                random_number = str(file_input.file).split("/")[-1].split("_")[-1].split(".")[0]
-                # get file name
-                input_name = str(file_input.file_name).split(".")[0] + "_" + random_number + ".pdf"
-                
-                output_name = (
-                    str(file_input.file_name).split(".")[0] + "_translated_" + str(translation_data["language"]) + ".pdf"
-                )
-
-                random_output_name = str(file_input.file_name).split(".")[0] + "_" + random_number + "_translated_" + str(translation_data["language"]) + ".pdf"
-
-                # get language
-                original_language = file_input.language
-                target_language = translation_data["language"]
-
-                # main process...
-                # upload file just saved to firebase storage
-                file_name_input = os.path.join(pdf_folder, input_name)
-                file_name_output = os.path.join(pdf_folder, random_output_name)
-                
-                
-                # TODO: process file_output by using AI model and update later...
-                obj.translate_pdf(
-                    language=target_language,
-                    input_path=file_name_input,
-                    output_path=pdf_folder,
-                    merge=False,
-                )
-                
-                temp_file = os.path.join(pdf_folder, input_name.split(".")[0] + "_translated_" + target_language + ".pdf")
-
-                shutil.copyfile(temp_file, file_name_output)
-                os.remove(temp_file)
-                
-                bucket = storage.bucket()
-                blob = bucket.blob(random_output_name)
-                blob.upload_from_filename(file_name_output)
-
-                # make public access from the URL
-                blob.make_public()
-
-                # delete original pdf and output pdf just saved from pdf folder
-                os.remove(file_name_input)
-                os.remove(file_name_output)
-
-                new_pdf = PDF(
-                    owner_id=file_input.owner_id,
-                    file=blob.public_url,
-                    language=target_language,
-                    file_name=output_name,
-                )
-                new_pdf.save()
-
-                current_data = {}
-                current_data["status"] = 1
-                current_data["file_input"] = file_input.pdf_id
-                current_data["file_output"] = new_pdf.pdf_id
-                translation_serializer = TranslationSerializer(data=current_data)
-                if translation_serializer.is_valid():
-                    translation_serializer.save()
-                    current_data = translation_serializer.data
-                    current_data.update({"file_input_url": file_input.getFileUrl(), "file_output_url": new_pdf.getFileUrl()})
-                    return Response(
-                        {"status": "success", "data": current_data},
-                        status=status.HTTP_200_OK,
-                    )
+                # The translation is done by the translation_worker command,
+                # the client polls GetTranslationData until status is not 0
+                translation = enqueue_translation(file_input, translation_data["language"])
+                current_data = TranslationSerializer(translation).data
+                current_data.update({"file_input_url": file_input.getFileUrl(), "file_output_url": None})
                 return Response(
-                    {"status": "error", "data": translation_serializer.errors},
-                    status=status.HTTP_400_BAD_REQUEST,
+                    {"status": "success", "data": current_data},
+                    status=status.HTTP_200_OK,
                 )
             else:
                 current_data = {}
@@ -388,7 +322,7 @@ class GetTranslationData(APIView):
                 file_input,
                 file_output,
                 username,
-                status,
+                translation_status,
             ) = Translation.objects.get(
                 translation_id=translation_id
             ).getTranslationData()
@@ -396,7 +330,7 @@ class GetTranslationData(APIView):
             response_data["file_input"] = file_input
             response_data["file_output"] = file_output
             response_data["username"] = username
-            response_data["status"] = status
+            response_data["status"] = translation_status
             return Response(
                 {"status": "Got translation data successfully!", "data": response_data},
                 status=status.HTTP_200_OK,
@@ -554,7 +488,7 @@ class HistoryView(APIView):
                         "file_input": temp_translation.getFileInputName(),
                         "file_input_url": temp_translation.getFileInput().getFileUrl(),
                         "file_output": temp_translation.getFileOutputName(),
-                        "file_output_url": temp_translation.getFileOutput().getFileUrl(),
+                        "file_output_url": temp_translation.getFileOutput().getFileUrl() if temp_translation.getFileOutput() else None,
                         "status": temp_translation.getStatus(),
                         "time": temp_translation.time_stamp,
                     }
@@ -0,0 +1,142 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class _Request:
+    def __init__(self, inputs: Sequence[Any]):
+        self.inputs = list(inputs)
+        self.submitted_at = time.perf_counter()
+        self.done = threading.Event()
+        self.outputs = None
+        self.error = None
+
+
+class BatchScheduler:
+    """Run the inputs submitted by several threads through fn in shared batches.
+
+    A single dispatcher thread takes the first pending request, then keeps
+    adding the requests that arrive within max_wait_seconds, until the
+    batch holds max_batch_size inputs. fn runs once on the whole batch and
+    each request gets back the outputs of its own inputs. A request larger
+    than max_batch_size still runs in one call.
+
+    Attributes
+    ----------
+    batches: int
+        Number of fn calls.
+    requests: int
+        Number of requests served.
+    items: int
+        Number of inputs run through fn.
+    max_items: int
+        Largest batch run.
+    queue_seconds: float
+        Total time requests waited before their batch started.
+    max_queue_seconds: float
+        Longest such wait.
+    busy_seconds: float
+        Total time spent in fn.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 16,
+        max_wait_seconds: float = 0.02,
+        name: str = "batch-scheduler",
+    ):
+        """
+        Parameters
+        ----------
+        fn: Callable[[List[Any]], List[Any]]
+            Batched function, one output per input, in order.
+        max_batch_size: int
+            Number of inputs after which a batch starts without waiting.
+        max_wait_seconds: float
+            Time a batch waits for more requests after the first one.
+        name: str
+            Name of the dispatcher thread.
+        """
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.items = 0
+        self.max_items = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.busy_seconds = 0.0
+        threading.Thread(target=self._dispatch, name=name, daemon=True).start()
+
+    def __call__(self, inputs: Sequence[Any]) -> List[Any]:
+        """Run inputs through fn with the inputs of the other threads, wait for the outputs."""
+        if not inputs:
+            return []
+        request = _Request(inputs)
+        self._pending.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.outputs
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._pending.get()]
+        size = len(batch[0].inputs)
+        deadline = time.perf_counter() + self.max_wait_seconds
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._pending.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.inputs)
+        return batch
+
+    def _dispatch(self) -> None:
+        while True:
+            batch = self._collect()
+            inputs = [x for request in batch for x in request.inputs]
+            start_time = time.perf_counter()
+            try:
+                outputs = self.fn(inputs)
+                offset = 0
+                for request in batch:
+                    request.outputs = outputs[offset:offset + len(request.inputs)]
+                    offset += len(request.inputs)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            end_time = time.perf_counter()
+            with self._lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.items += len(inputs)
+                self.max_items = max(self.max_items, len(inputs))
+                for request in batch:
+                    self.queue_seconds += start_time - request.submitted_at
+                    self.max_queue_seconds = max(self.max_queue_seconds, start_time - request.submitted_at)
+                self.busy_seconds += end_time - start_time
+            for request in batch:
+                request.done.set()
+
+    def stats(self) -> Dict[str, float]:
+        """Batch sizes and queueing delays since the scheduler started."""
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_items,
+                "mean_queue_seconds": self.queue_seconds / self.requests if self.requests else 0.0,
+                "max_queue_seconds": self.max_queue_seconds,
+                "busy_seconds": self.busy_seconds,
+            }
@@ -0,0 +1,130 @@
+import re
+from typing import List, Sequence
+
+# A block ending with one of these closes its sentence
+SENTENCE_END = re.compile(r"[.!?:。！？：]\s*$")
+
+
+def reading_order(
+    boxes: Sequence[Sequence[float]], min_overlap: float = 0.5, full_width: float = 0.6
+) -> List[List[int]]:
+    """Sort boxes into columns, left to right, each read top to bottom.
+
+    A box is full-width when it spans at least full_width of the width
+    covered by all the boxes, like a title or an abstract above two
+    columns. Consecutive full-width boxes form a column of their own, and
+    cut the page into bands read top to bottom. In each band, a box joins
+    a column when it overlaps the horizontal extent of the first box of
+    the column by at least min_overlap of the narrower of the two.
+
+    Parameters
+    ----------
+    boxes: Sequence[Sequence[float]]
+        x0 y0 x1 y1 of each box.
+    min_overlap: float
+        Minimum horizontal overlap to be in the same column.
+    full_width: float
+        Minimum share of the page width of a full-width box.
+
+    Returns
+    -------
+    List[List[int]]
+        Indices of the boxes of each column.
+    """
+    if not boxes:
+        return []
+    page_width = max(box[2] for box in boxes) - min(box[0] for box in boxes)
+
+    # Runs of full-width boxes and of other boxes, top to bottom
+    bands = []
+    for i in sorted(range(len(boxes)), key=lambda i: boxes[i][1]):
+        wide = boxes[i][2] - boxes[i][0] >= full_width * page_width
+        if not bands or bands[-1][0] != wide:
+            bands.append((wide, []))
+        bands[-1][1].append(i)
+
+    order = []
+    for wide, indices in bands:
+        if wide:
+            order.append(indices)
+            continue
+        columns = []
+        for i in sorted(indices, key=lambda i: boxes[i][0]):
+            x0, _, x1, _ = boxes[i]
+            for column in columns:
+                overlap = min(x1, column["x1"]) - max(x0, column["x0"])
+                if overlap >= min_overlap * min(x1 - x0, column["x1"] - column["x0"]):
+                    column["indices"].append(i)
+                    break
+            else:
+                columns.append({"x0": x0, "x1": x1, "indices": [i]})
+        order += [sorted(column["indices"], key=lambda i: boxes[i][1]) for column in columns]
+    return order
+
+
+def group_blocks(texts: Sequence[str], boxes: Sequence[Sequence[float]], max_gap: float) -> List[List[int]]:
+    """Group the text blocks of a page into translation units.
+
+    Blocks are taken in reading order. A block is merged into the unit of
+    the previous one when it is right below it in the same column, with at
+    most max_gap between them and no overlap, or when it starts a new column while the
+    previous block stops in the middle of a sentence.
+
+    Parameters
+    ----------
+    texts: Sequence[str]
+        Text of each block.
+    boxes: Sequence[Sequence[float]]
+        x0 y0 x1 y1 of each block.
+    max_gap: float
+        Maximum vertical gap between two merged blocks of a column.
+
+    Returns
+    -------
+    List[List[int]]
+        Indices of the blocks of each unit, in reading order.
+    """
+    units = []
+    previous = None
+    for column_index, column in enumerate(reading_order(boxes)):
+        for row_index, i in enumerate(column):
+            if previous is not None:
+                if row_index > 0:
+                    merge = 0 <= boxes[i][1] - boxes[previous][3] <= max_gap
+                else:
+                    merge = not SENTENCE_END.search(texts[previous])
+                if merge:
+                    units[-1].append(i)
+                    previous = i
+                    continue
+            units.append([i])
+            previous = i
+    return units
+
+
+def split_by_area(text: str, areas: Sequence[float]) -> List[str]:
+    """Cut text into len(areas) consecutive parts of length proportional to areas.
+
+    Each cut is moved to the closest whitespace, if there is one nearby,
+    so that words stay whole. Text without spaces (Japanese) is cut
+    between characters. A part can be empty when text is short.
+    """
+    total = sum(areas)
+    if len(areas) <= 1 or total <= 0:
+        return [text] + [""] * (len(areas) - 1)
+    spaces = [match.start() for match in re.finditer(r"\s", text)]
+    window = max(1, len(text) // (4 * len(areas)))
+    parts = []
+    start = 0
+    cumulative = 0.0
+    for area in areas[:-1]:
+        cumulative += area
+        cut = int(round(len(text) * cumulative / total))
+        nearby = [space for space in spaces if abs(space - cut) <= window and space >= start]
+        if nearby:
+            cut = min(nearby, key=lambda space: abs(space - cut))
+        cut = max(cut, start)
+        parts.append(text[start:cut].strip())
+        start = cut
+    parts.append(text[start:].strip())
+    return parts
@@ -0,0 +1,116 @@
+import http.client
+import json
+import os
+import socket
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+DEFAULT_ADDRESS = "unix:///tmp/translation-server.sock"
+HEALTH_TIMEOUT = 5.0
+
+
+class TranslationServerError(Exception):
+    """The model server is unreachable or could not process a request."""
+
+
+def parse_address(address: str) -> Tuple[str, Union[str, Tuple[str, int]]]:
+    """Split "unix:///path/to.sock" or "http://host:port" into (scheme, location)."""
+    url = urlparse(address)
+    if url.scheme == "unix":
+        return "unix", url.path
+    if url.scheme == "http":
+        return "http", (url.hostname or "127.0.0.1", url.port or 80)
+    raise ValueError(f"Unsupported model server address {address}, use unix:// or http://.")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class TranslationClient:
+    """Client of the model server (Model/server.py) used by the web workers.
+
+    It only depends on the standard library, so importing it does not
+    load torch or any model. No connection is made until the first call,
+    and each call uses its own short-lived connection.
+    translate_pdf has the same signature as
+    TranslationLayoutRecovery.translate_pdf, with paths only: the files are
+    read and written by the server, on the same host.
+    """
+
+    def __init__(self, address: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Parameters
+        ----------
+        address: Optional[str]
+            unix:///path/to.sock or http://host:port of the server.
+            Defaults to TRANSLATION_SERVER_ADDRESS.
+        timeout: Optional[float]
+            Seconds to wait for a translation, None to wait as long as it takes.
+        """
+        self.address = address or os.getenv("TRANSLATION_SERVER_ADDRESS") or DEFAULT_ADDRESS
+        self.scheme, self.location = parse_address(self.address)
+        self.timeout = timeout
+
+    def _connection(self, timeout: Optional[float]) -> http.client.HTTPConnection:
+        if self.scheme == "unix":
+            return _UnixHTTPConnection(self.location, timeout=timeout)
+        return http.client.HTTPConnection(*self.location, timeout=timeout)
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+                 timeout: Optional[float] = None) -> Dict[str, Any]:
+        connection = self._connection(timeout)
+        try:
+            body = json.dumps(payload).encode() if payload is not None else None
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+        except (OSError, http.client.HTTPException) as e:
+            raise TranslationServerError(f"Model server unreachable at {self.address}: {e}") from e
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise TranslationServerError(data.get("error", f"HTTP {response.status}"))
+        return data
+
+    def health(self) -> Dict[str, Any]:
+        """Status of the server: "loading", "ok" or "error", queue length and counters."""
+        return self._request("GET", "/health", timeout=HEALTH_TIMEOUT)
+
+    def translate_pdf(
+        self,
+        input_path: Union[str, Path],
+        language: str,
+        output_file: Union[str, Path],
+    ) -> Dict[str, Any]:
+        """Translate a PDF file on the server.
+
+        Parameters
+        ----------
+        input_path: Union[str, Path]
+            Path to the PDF file.
+        language: str
+            Target language, "vi" or "ja".
+        output_file: Union[str, Path]
+            Path of the translated PDF file.
+
+        Returns
+        -------
+        Dict[str, Any]
+            last_stats of the server pipeline for this translation.
+        """
+        payload = {
+            "input_path": os.path.abspath(input_path),
+            "language": language,
+            "output_file": os.path.abspath(output_file),
+        }
+        return self._request("POST", "/translate", payload, timeout=self.timeout)["stats"]
@@ -0,0 +1,369 @@
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import torch
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+NMT_MODELS = {
+    "vi": "VietAI/envit5-translation",
+    "ja": "Helsinki-NLP/opus-mt-en-jap",
+}
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.getenv(name) or default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_models(name: str) -> Dict[str, str]:
+    """Parse "language=model,language=model" into a dict, NMT_MODELS when unset."""
+    value = os.getenv(name, "")
+    if not value:
+        return dict(NMT_MODELS)
+    models = {}
+    for pair in filter(None, value.split(",")):
+        language, model_name = pair.split("=")
+        models[language.strip()] = model_name.strip()
+    return models
+
+
+def _env_workers(name: str) -> Dict[str, int]:
+    """Parse "stage=threads,stage=threads" into a dict."""
+    value = os.getenv(name, "")
+    workers = {}
+    for pair in filter(None, value.split(",")):
+        stage, threads = pair.split("=")
+        workers[stage.strip()] = int(threads)
+    return workers
+
+
+@dataclass
+class PipelineConfig:
+    """Runtime configuration shared by every stage of the pipeline.
+
+    Attributes
+    ----------
+    device: str
+        Torch device used by the detector and the translation models.
+        "auto" picks "cuda" when it is available and "cpu" otherwise.
+    num_threads: int
+        Intra-op threads used by torch on CPU. 0 keeps the torch default.
+    num_interop_threads: int
+        Inter-op threads used by torch on CPU. 0 keeps the torch default.
+    model_path: str
+        Path to the PubLayNet Mask R-CNN checkpoint.
+    detector_mode: str
+        "box" runs the Faster R-CNN part of the layout model only, "mask"
+        also runs the unused mask head.
+    detector_backend: str
+        "torch" runs the layout model with PyTorch, "onnx" runs the graph
+        exported by Model.onnx_detector on ONNX Runtime (CPU only).
+    detector_onnx_path: str
+        Path to the exported layout model.
+    rpn_pre_nms_top_n: int
+        RPN proposals kept per feature level before NMS.
+    rpn_post_nms_top_n: int
+        RPN proposals kept after NMS.
+    box_score_thresh: float
+        Minimum score of the detections returned by the box head.
+    box_nms_thresh: float
+        IoU threshold of the NMS of the box head.
+    box_detections_per_img: int
+        Maximum number of detections per page.
+    layout_score_threshold: float
+        Minimum score of the layout boxes that are read and translated.
+    detector_precision: str
+        Precision profile of the torch layout model: "fp32", "bf16"
+        (autocast) or "int8" (dynamic quantization of the Linear layers,
+        CPU only).
+    nmt_precision: str
+        Precision profile of the translation models, same choices.
+    nmt_models: Dict[str, str]
+        Translation model of each target language. A model is loaded the
+        first time its language is requested.
+    nmt_memory_budget_mb: int
+        Maximum total size of the loaded translation models, the least
+        recently used are unloaded beyond it. 0 for no limit.
+    nmt_preload: List[str]
+        Languages whose translation model is loaded at startup.
+    detector_max_batch_size: int
+        Pages after which a shared detector batch runs without waiting.
+    detector_batch_wait_ms: float
+        Time a detector batch waits for the pages of other documents
+        translated at the same time, 0 to run each batch right away on
+        its own.
+    poppler_path: Optional[str]
+        Directory containing the poppler binaries, None to use the PATH.
+    font_dir: str
+        Directory containing the fonts used for rendering.
+    batch_size: int
+        Number of pages processed together.
+    dpi: int
+        Resolution used to rasterize the PDF pages.
+    channels_last: bool
+        Use the channels-last memory format for the detector on CPU.
+    renderer: str
+        "fitz" renders pages with PyMuPDF, "poppler" with pdf2image.
+    nmt_max_batch_tokens: int
+        Maximum number of padded input tokens per generate call.
+    nmt_max_batch_size: int
+        Maximum number of chunks per generate call.
+    nmt_max_chunk_tokens: int
+        Maximum number of tokens of the chunks a text block is split into.
+    nmt_max_new_tokens_ratio: float
+        Generated tokens allowed per input token, 0 to always allow the
+        maximum length of 512.
+    nmt_loop_max_period: int
+        Longest n-gram whose repetition stops decoding, 0 to disable.
+    nmt_loop_min_repeats: int
+        Number of repeats of the n-gram after which decoding stops and the
+        chunk falls back to its source text.
+    nmt_batch_wait_ms: float
+        Time a chunk waits for the chunks of other documents to fill its
+        batch in the shared translation service, 0 to translate the chunks
+        of each document in their own batches.
+    nmt_language_batches: int
+        Batches of one language the shared translation service runs in a
+        row before turning to another language with chunks waiting.
+    use_translation_memory: bool
+        Look chunks up in the translation memory before translating them.
+    translation_memory_path: Optional[str]
+        SQLite file of the translation memory, None to keep it in-process.
+    translation_memory_max_entries: int
+        Maximum number of translations kept on disk.
+    translation_memory_lru_size: int
+        Maximum number of translations kept in the in-process LRU.
+    translation_memory_corpus: Optional[str]
+        JSON lines corpus used to pre-warm the translation memory.
+    use_text_layer: bool
+        Read the embedded PDF text instead of running OCR when possible.
+    text_layer_min_chars: int
+        Pages with fewer embedded characters are treated as scanned.
+    ocr_batch_size: int
+        Number of crops per OCR detector call and recognizer batch size.
+    ocr_mode: str
+        "crop" OCRs every layout box, "page" OCRs each page once and
+        assigns the text lines to the layout boxes.
+    use_pipeline: bool
+        Overlap the stages of consecutive page batches on threads.
+    pipeline_queue_size: int
+        Maximum number of page batches waiting in front of each stage.
+    pipeline_workers: Dict[str, int]
+        Number of threads of the detect, ocr, translate and render
+        stages, 1 when missing.
+    merge_blocks: bool
+        Translate consecutive text blocks of a column as one unit and
+        spread the translation over the blocks in proportion to their area.
+    block_merge_max_gap: float
+        Maximum vertical gap, in PDF points, between two merged blocks.
+    output_mode: str
+        "raster" draws the translation on page images, "vector" keeps the
+        original PDF pages and writes the translation as real text.
+    repetition_min_length: int
+        Minimum length of a pattern repeated in a translation stuck in a
+        loop.
+    repetition_min_repeats: int
+        Number of repeats of such a pattern after which the translation
+        is discarded in favour of the source text.
+    """
+    device: str = "auto"
+    num_threads: int = 0
+    num_interop_threads: int = 0
+    model_path: str = str(ROOT_DIR / "Backend" / "model_196000.pth")
+    detector_mode: str = "box"
+    detector_backend: str = "torch"
+    detector_onnx_path: str = str(ROOT_DIR / "Backend" / "model_196000.onnx")
+    rpn_pre_nms_top_n: int = 1000
+    rpn_post_nms_top_n: int = 1000
+    box_score_thresh: float = 0.05
+    box_nms_thresh: float = 0.5
+    box_detections_per_img: int = 100
+    layout_score_threshold: float = 0.7
+    detector_precision: str = "fp32"
+    nmt_precision: str = "fp32"
+    nmt_models: Dict[str, str] = field(default_factory=lambda: dict(NMT_MODELS))
+    nmt_memory_budget_mb: int = 0
+    nmt_preload: List[str] = field(default_factory=list)
+    detector_max_batch_size: int = 16
+    detector_batch_wait_ms: float = 20.0
+    poppler_path: Optional[str] = None
+    font_dir: str = field(default_factory=os.getcwd)
+    batch_size: int = 8
+    dpi: int = 300
+    channels_last: bool = True
+    renderer: str = "fitz"
+    nmt_max_batch_tokens: int = 4096
+    nmt_max_batch_size: int = 32
+    nmt_max_chunk_tokens: int = 200
+    nmt_max_new_tokens_ratio: float = 2.0
+    nmt_loop_max_period: int = 8
+    nmt_loop_min_repeats: int = 4
+    nmt_batch_wait_ms: float = 10.0
+    nmt_language_batches: int = 4
+    use_translation_memory: bool = True
+    translation_memory_path: Optional[str] = str(ROOT_DIR / "Backend" / "translation_memory.sqlite3")
+    translation_memory_max_entries: int = 100000
+    translation_memory_lru_size: int = 4096
+    translation_memory_corpus: Optional[str] = None
+    use_text_layer: bool = True
+    text_layer_min_chars: int = 20
+    ocr_batch_size: int = 8
+    ocr_mode: str = "crop"
+    use_pipeline: bool = True
+    pipeline_queue_size: int = 2
+    pipeline_workers: Dict[str, int] = field(default_factory=dict)
+    merge_blocks: bool = True
+    block_merge_max_gap: float = 12.0
+    output_mode: str = "raster"
+    repetition_min_length: int = 10
+    repetition_min_repeats: int = 15
+
+    def __post_init__(self):
+        if self.device == "auto":
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    @classmethod
+    def from_env(cls) -> "PipelineConfig":
+        """Build a configuration from the TRANSLATION_* environment variables."""
+        defaults = cls.__dataclass_fields__
+        return cls(
+            device=_env_str("TRANSLATION_DEVICE", defaults["device"].default),
+            num_threads=_env_int("TRANSLATION_NUM_THREADS", defaults["num_threads"].default),
+            num_interop_threads=_env_int(
+                "TRANSLATION_NUM_INTEROP_THREADS", defaults["num_interop_threads"].default
+            ),
+            model_path=_env_str("TRANSLATION_MODEL_PATH", defaults["model_path"].default),
+            detector_mode=_env_str("TRANSLATION_DETECTOR_MODE", defaults["detector_mode"].default),
+            detector_backend=_env_str("TRANSLATION_DETECTOR_BACKEND", defaults["detector_backend"].default),
+            detector_onnx_path=_env_str(
+                "TRANSLATION_DETECTOR_ONNX_PATH", defaults["detector_onnx_path"].default
+            ),
+            rpn_pre_nms_top_n=_env_int(
+                "TRANSLATION_RPN_PRE_NMS_TOP_N", defaults["rpn_pre_nms_top_n"].default
+            ),
+            rpn_post_nms_top_n=_env_int(
+                "TRANSLATION_RPN_POST_NMS_TOP_N", defaults["rpn_post_nms_top_n"].default
+            ),
+            box_score_thresh=_env_float(
+                "TRANSLATION_BOX_SCORE_THRESH", defaults["box_score_thresh"].default
+            ),
+            box_nms_thresh=_env_float("TRANSLATION_BOX_NMS_THRESH", defaults["box_nms_thresh"].default),
+            box_detections_per_img=_env_int(
+                "TRANSLATION_BOX_DETECTIONS_PER_IMG", defaults["box_detections_per_img"].default
+            ),
+            layout_score_threshold=_env_float(
+                "TRANSLATION_LAYOUT_SCORE_THRESHOLD", defaults["layout_score_threshold"].default
+            ),
+            detector_precision=_env_str(
+                "TRANSLATION_DETECTOR_PRECISION", defaults["detector_precision"].default
+            ),
+            nmt_precision=_env_str("TRANSLATION_NMT_PRECISION", defaults["nmt_precision"].default),
+            nmt_models=_env_models("TRANSLATION_NMT_MODELS"),
+            nmt_memory_budget_mb=_env_int(
+                "TRANSLATION_NMT_MEMORY_BUDGET_MB", defaults["nmt_memory_budget_mb"].default
+            ),
+            nmt_preload=[
+                language.strip() for language in os.getenv("TRANSLATION_NMT_PRELOAD", "").split(",") if language.strip()
+            ],
+            detector_max_batch_size=_env_int(
+                "TRANSLATION_DETECTOR_MAX_BATCH_SIZE", defaults["detector_max_batch_size"].default
+            ),
+            detector_batch_wait_ms=_env_float(
+                "TRANSLATION_DETECTOR_BATCH_WAIT_MS", defaults["detector_batch_wait_ms"].default
+            ),
+            poppler_path=os.getenv("TRANSLATION_POPPLER_PATH") or None,
+            font_dir=_env_str("TRANSLATION_FONT_DIR", os.getcwd()),
+            batch_size=_env_int("TRANSLATION_BATCH_SIZE", defaults["batch_size"].default),
+            dpi=_env_int("TRANSLATION_DPI", defaults["dpi"].default),
+            channels_last=os.getenv("TRANSLATION_CHANNELS_LAST", "1") != "0",
+            renderer=_env_str("TRANSLATION_RENDERER", defaults["renderer"].default),
+            nmt_max_batch_tokens=_env_int(
+                "TRANSLATION_NMT_MAX_BATCH_TOKENS", defaults["nmt_max_batch_tokens"].default
+            ),
+            nmt_max_batch_size=_env_int(
+                "TRANSLATION_NMT_MAX_BATCH_SIZE", defaults["nmt_max_batch_size"].default
+            ),
+            nmt_max_chunk_tokens=_env_int(
+                "TRANSLATION_NMT_MAX_CHUNK_TOKENS", defaults["nmt_max_chunk_tokens"].default
+            ),
+            nmt_max_new_tokens_ratio=_env_float(
+                "TRANSLATION_NMT_MAX_NEW_TOKENS_RATIO", defaults["nmt_max_new_tokens_ratio"].default
+            ),
+            nmt_loop_max_period=_env_int(
+                "TRANSLATION_NMT_LOOP_MAX_PERIOD", defaults["nmt_loop_max_period"].default
+            ),
+            nmt_loop_min_repeats=_env_int(
+                "TRANSLATION_NMT_LOOP_MIN_REPEATS", defaults["nmt_loop_min_repeats"].default
+            ),
+            nmt_batch_wait_ms=_env_float("TRANSLATION_NMT_BATCH_WAIT_MS", defaults["nmt_batch_wait_ms"].default),
+            nmt_language_batches=_env_int(
+                "TRANSLATION_NMT_LANGUAGE_BATCHES", defaults["nmt_language_batches"].default
+            ),
+            use_translation_memory=os.getenv("TRANSLATION_MEMORY", "1") != "0",
+            translation_memory_path=_env_str(
+                "TRANSLATION_MEMORY_PATH", defaults["translation_memory_path"].default
+            ),
+            translation_memory_max_entries=_env_int(
+                "TRANSLATION_MEMORY_MAX_ENTRIES", defaults["translation_memory_max_entries"].default
+            ),
+            translation_memory_lru_size=_env_int(
+                "TRANSLATION_MEMORY_LRU_SIZE", defaults["translation_memory_lru_size"].default
+            ),
+            translation_memory_corpus=os.getenv("TRANSLATION_MEMORY_CORPUS") or None,
+            use_text_layer=os.getenv("TRANSLATION_TEXT_LAYER", "1") != "0",
+            text_layer_min_chars=_env_int(
+                "TRANSLATION_TEXT_LAYER_MIN_CHARS", defaults["text_layer_min_chars"].default
+            ),
+            ocr_batch_size=_env_int("TRANSLATION_OCR_BATCH_SIZE", defaults["ocr_batch_size"].default),
+            ocr_mode=_env_str("TRANSLATION_OCR_MODE", defaults["ocr_mode"].default),
+            use_pipeline=os.getenv("TRANSLATION_PIPELINE", "1") != "0",
+            pipeline_queue_size=_env_int(
+                "TRANSLATION_PIPELINE_QUEUE_SIZE", defaults["pipeline_queue_size"].default
+            ),
+            pipeline_workers=_env_workers("TRANSLATION_PIPELINE_WORKERS"),
+            merge_blocks=os.getenv("TRANSLATION_MERGE_BLOCKS", "1") != "0",
+            block_merge_max_gap=_env_float(
+                "TRANSLATION_BLOCK_MERGE_MAX_GAP", defaults["block_merge_max_gap"].default
+            ),
+            output_mode=_env_str("TRANSLATION_OUTPUT_MODE", defaults["output_mode"].default),
+            repetition_min_length=_env_int(
+                "TRANSLATION_REPETITION_MIN_LENGTH", defaults["repetition_min_length"].default
+            ),
+            repetition_min_repeats=_env_int(
+                "TRANSLATION_REPETITION_MIN_REPEATS", defaults["repetition_min_repeats"].default
+            ),
+        )
+
+    @property
+    def use_cuda(self) -> bool:
+        return self.device.startswith("cuda")
+
+    def setup_torch(self) -> None:
+        """Apply the thread settings to torch.
+
+        Only meaningful on CPU, where the default thread pools are sized
+        for the whole machine and oversubscribe when several workers share
+        a node.
+        """
+        if self.use_cuda:
+            return
+        if self.num_threads > 0:
+            torch.set_num_threads(self.num_threads)
+        if self.num_interop_threads > 0:
+            try:
+                torch.set_num_interop_threads(self.num_interop_threads)
+            except RuntimeError:
+                # Can only be set once per process, before any parallel work
+                pass
@@ -0,0 +1,34 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Dict
+
+
+@dataclass(eq=False)
+class TranslationContext:
+    """State of the translation of one document.
+
+    TranslationLayoutRecovery only holds the loaded models and the
+    configuration. Everything specific to a translate_pdf call lives here
+    and is passed along to every stage, so that one instance can translate
+    several documents at once from different threads.
+
+    Attributes
+    ----------
+    language: str
+        Target language, "vi" or "ja".
+    nmt_stats: Dict[str, int]
+        Counters of the translation model for this document.
+    preprocess_stats: Dict[str, int]
+        Counters of the detector preprocessing for this document.
+    """
+    language: str
+    nmt_stats: Dict[str, int] = field(default_factory=dict)
+    preprocess_stats: Dict[str, int] = field(default_factory=dict)
+    # Stages of the same document can run on several threads
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def count(self, stats: Dict[str, int], counters: Dict[str, int]) -> None:
+        """Add counters to stats, one of the counter dicts of the context."""
+        with self.lock:
+            for key, value in counters.items():
+                stats[key] = stats.get(key, 0) + value
@@ -2,8 +2,7 @@ import copy
 import math
 import re
 from pathlib import Path
-from typing import List, Tuple, Union
-import matplotlib.pyplot as plt
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
 import numpy as np
 from pdf2image import convert_from_bytes, convert_from_path
 from PIL import Image, ImageDraw, ImageFont
@@ -11,22 +10,34 @@ from tqdm import tqdm
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 from Model.utils.textwrap_japanese import fw_fill_ja
 from Model.utils.textwrap_vietnamese import fw_fill_vi
-import torchvision
-from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
-from torchvision.models.detection.mask_rcnn import MaskRCNNPredictor
-from torchvision.models.detection import MaskRCNN_ResNet50_FPN_Weights
-from torchvision.transforms import transforms
+from Model.batching import BatchScheduler
+from Model.blocks import group_blocks, split_by_area
+from Model.config import PipelineConfig
+from Model.context import TranslationContext
+from Model.nmt import SharedTokenizer, batched_generate, split_by_tokens
+from Model.nmt_service import NmtService
+from Model.ocr import batched_readtext, page_readtext
+from Model.pipeline import Pipeline, Stage
+from Model.precision import autocast, model_size_bytes, prepare_model
+from Model.preprocess import PageMeta, preprocess_pages
+from Model.registry import ModelRegistry
+from Model.repetition import has_repetition
+from Model.vector_output import insert_text_fit, redact_rects
+from Model.writer import DocumentWriter
+from Model.text_layer import PageText
+from Model.translation_memory import TranslationMemory
+from torchvision.models.detection import MaskRCNN
+from torchvision.models.detection.backbone_utils import resnet_fpn_backbone
+from torchvision.ops.misc import FrozenBatchNorm2d
 import torch
 import random
-import cv2
 import os
 import fitz
 import easyocr
 # from paddleocr import PaddleOCR
+import threading
 import time
 
-from Backend.services.settings import MEDIA_ROOT
-
 seed = 1234
 random.seed(seed)
 torch.manual_seed(seed)
@@ -42,28 +53,79 @@ CATEGORIES2LABELS = {
     4: "table",
     5: "figure"
 }
-MODEL_PATH = "D:/dev/translation_layoutrecovery/Backend/model_196000.pth"
-def get_instance_segmentation_model(num_classes):
+
+def get_instance_segmentation_model(num_classes, box_only=False, **kwargs):
     '''
     This function returns a Mask R-CNN model with a ResNet-50-FPN backbone.
     The model is pretrained on the PubLayNet dataset. 
     -----
     Input:
         num_classes: number of classes
+        box_only: drop the mask branch, leaving the Faster R-CNN part that
+            predicts boxes, labels and scores only
+        kwargs: RPN and box head settings passed to MaskRCNN
+    Output:
+        model: Mask R-CNN model with a ResNet-50-FPN backbone, with
+            untrained weights to be loaded with load_checkpoint
+    '''
+    # No pretrained weights: every tensor is overwritten by the PubLayNet
+    # checkpoint, so nothing is downloaded. The frozen batch norms and the
+    # heads for num_classes match the layout of the checkpoint.
+    backbone = resnet_fpn_backbone(backbone_name="resnet50", weights=None, norm_layer=FrozenBatchNorm2d)
+    model = MaskRCNN(backbone, num_classes=num_classes, **kwargs)
+    # The COCO weights the model was fine-tuned from use eps=0 in their
+    # batch norms, maskrcnn_resnet50_fpn sets it when loading them
+    for module in model.modules():
+        if isinstance(module, FrozenBatchNorm2d):
+            module.eps = 0.0
+    if box_only:
+        # RoIHeads only runs the mask branch when all three are set
+        model.roi_heads.mask_roi_pool = None
+        model.roi_heads.mask_head = None
+        model.roi_heads.mask_predictor = None
+    return model
+
+def get_layout_model_kwargs(config):
+    '''
+    This function returns the RPN and box head settings of the layout
+    model from the configuration.
+    -----
+    Input:
+        config: PipelineConfig
     Output:
-        model: Mask R-CNN model with a ResNet-50-FPN backbone
+        kwargs: keyword arguments of get_instance_segmentation_model
     '''
-    model = torchvision.models.detection.maskrcnn_resnet50_fpn(weights=MaskRCNN_ResNet50_FPN_Weights.DEFAULT)
-    in_features = model.roi_heads.box_predictor.cls_score.in_features
-    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
-    in_features_mask = model.roi_heads.mask_predictor.conv5_mask.in_channels
-    hidden_layer = 256
-
-    model.roi_heads.mask_predictor = MaskRCNNPredictor(
-        in_features_mask,
-        hidden_layer,
-        num_classes
+    return dict(
+        rpn_pre_nms_top_n_test=config.rpn_pre_nms_top_n,
+        rpn_post_nms_top_n_test=config.rpn_post_nms_top_n,
+        box_score_thresh=config.box_score_thresh,
+        box_nms_thresh=config.box_nms_thresh,
+        box_detections_per_img=config.box_detections_per_img,
     )
+
+def load_checkpoint(model, checkpoint_path, box_only=False):
+    '''
+    This function loads the PubLayNet checkpoint into a model returned by
+    get_instance_segmentation_model.
+    The checkpoint is memory-mapped and its tensors become the parameters
+    of the model, they are not copied into the random initial weights.
+    -----
+    Input:
+        model: model returned by get_instance_segmentation_model
+        checkpoint_path: path to the checkpoint
+        box_only: skip the weights of the mask branch
+    Output:
+        model: the same model
+    '''
+    try:
+        checkpoint = torch.load(checkpoint_path, map_location="cpu", mmap=True)
+    except RuntimeError:
+        # Checkpoints saved in the legacy format cannot be memory-mapped
+        checkpoint = torch.load(checkpoint_path, map_location="cpu")
+    state_dict = checkpoint['model']
+    if box_only:
+        state_dict = {k: v for k, v in state_dict.items() if not k.startswith("roi_heads.mask_")}
+    model.load_state_dict(state_dict, assign=True)
     return model
 
 class TranslationLayoutRecovery:
@@ -75,426 +137,920 @@ class TranslationLayoutRecovery:
         Font for drawing text on the image
     ocr_model: EasyOCR
         OCR model for detecting text in the text blocks
-    translate_model: 
-        Translation model for translating text
-    translate_tokenizer: 
-        Tokenizer for decoding the output of the translation model
+    translation_models: ModelRegistry
+        Translation model and tokenizer of each target language,
+        loaded on first use
+    config: PipelineConfig
+        Device, thread and path settings used by every stage
+
+    The instance only holds the models: the state of each translate_pdf
+    call is kept in its own TranslationContext, so one instance can
+    translate several documents at once from different threads.
     """
-    DPI = 300
     FONT_SIZE_VIETNAMESE = 34
     FONT_SIZE_JAPANESE = 28
 
-    def __init__(self):
+    def __init__(self, config: Optional[PipelineConfig] = None):
+        self.config = config if config is not None else PipelineConfig.from_env()
+        self.device = torch.device(self.config.device)
+        self.config.setup_torch()
+        self.last_stats = {}
+        self._ocr_lock = threading.Lock()
         self._load_init()
 
-    def _repeated_substring(self, s: str):
-        n = len(s)
-        for i in range(10, n // 2 + 1):
-            pattern = s[:i]
-            matches = [match for match in re.finditer(rf'\b{re.escape(pattern)}\b', s)]
-            if len(matches) >= 15:
-                return True
-        for i in range(n // 2 + 11, n):
-            pattern = s[n // 2 + 1:i]
-            matches = [match for match in re.finditer(rf'\b{re.escape(pattern)}\b', s)]
-            if len(matches) >= 15:
-                return True
-        return False
-
-    def translate_pdf(self, input_path: Union[Path, bytes], language: str, output_path: Path, merge: bool) -> None:
-        """Backend function for translating PDF files."""
-        pdf_images = convert_from_path(
-            input_path, 
-            dpi=self.DPI, 
-            poppler_path=r"D:\dev\translation_layoutrecovery\Backend\poppler-24.08.0\Library\bin"
+    def _repeated_substring(self, s: str) -> bool:
+        return has_repetition(
+            s,
+            min_length=self.config.repetition_min_length,
+            min_repeats=self.config.repetition_min_repeats,
         )
-        
+
+    def translate_pdf(
+        self,
+        input_path: Union[Path, bytes],
+        language: str,
+        output_file: Union[str, Path, BinaryIO],
+    ) -> Dict[str, Any]:
+        """Backend function for translating PDF files.
+
+        Page batches go through the rasterize, detect, OCR, translate,
+        render and write stages of a Pipeline, so that consecutive batches
+        overlap instead of running strictly one after another. Finished
+        pages are appended to a single in-memory document, written once
+        to output_file at the end.
+
+        Parameters
+        ----------
+        input_path: Union[Path, bytes]
+            Path to the PDF file or its content.
+        language: str
+            Target language, "vi" or "ja".
+        output_file: Union[str, Path, BinaryIO]
+            Path of the translated PDF file or binary buffer to write it to.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Statistics of this translation, also kept in last_stats.
+        """
+        if language not in self.translation_models.model_names:
+            raise ValueError(
+                f"No translation model for language {language}, "
+                f"choose one of {', '.join(self.translation_models.model_names)}."
+            )
+        start_time = time.perf_counter()
         print("Language:", language)
-        self.language = language
-        pdf_files = []
-        reached_references = False
+        context = TranslationContext(language)
+        page_paths = []
+
+        batch_size = self.config.batch_size
+        writer = DocumentWriter(output_file, dpi=self.config.dpi)
+
+        def write_stage(item):
+            for translated_image in item.pop("translated_images"):
+                writer.add_image_page(translated_image)
+            for page_index, list_vector_blocks in enumerate(item.pop("vector_blocks")):
+                page = writer.add_pdf_page(source_doc, item["first_page"] + page_index)
+                self._write_vector_page(context, page, list_vector_blocks)
+            return item
+
+        workers = self.config.pipeline_workers
+        # The write stage runs on its own thread, it gets its own document
+        with self._open_pdf(input_path) as doc, self._open_pdf(input_path) as source_doc:
+            pipeline = Pipeline(
+                [
+                    # A fitz document cannot be shared between threads
+                    Stage("rasterize", lambda item: self._rasterize_stage(doc, input_path, item)),
+                    Stage("detect", lambda item: self._detect_stage(context, item), workers.get("detect", 1)),
+                    Stage(
+                        "ocr",
+                        self._ocr_stage,
+                        workers.get("ocr", 1),
+                        # Nothing after the references is translated, stop rendering
+                        stop_if=lambda item: item["reached_references"],
+                    ),
+                    Stage("translate", lambda item: self._translate_stage(context, item), workers.get("translate", 1)),
+                    Stage("render", lambda item: self._render_stage(context, item), workers.get("render", 1)),
+                    Stage("write", write_stage, ordered=True),
+                ],
+                queue_size=self.config.pipeline_queue_size,
+                threaded=self.config.use_pipeline,
+            )
+
+            # Pages are rendered lazily, one batch at a time, so that peak
+            # memory depends on batch_size rather than on the document length
+            page_batches = (
+                {"index": index, "first_page": first_page, "last_page": min(first_page + batch_size, doc.page_count)}
+                for index, first_page in enumerate(range(0, doc.page_count, batch_size))
+            )
+            for item in tqdm(pipeline.run(page_batches), total=math.ceil(doc.page_count / batch_size)):
+                page_paths += item["page_paths"]
+            file_id = writer.page_count
+            writer.close()
+
+        elapsed = time.perf_counter() - start_time
+        nmt_stats, preprocess_stats = context.nmt_stats, context.preprocess_stats
+        stats = {
+            "language": language,
+            "device": self.config.device,
+            "pages": file_id,
+            "seconds": elapsed,
+            "pages_per_sec": file_id / elapsed if elapsed > 0 else 0.0,
+            "page_paths": page_paths,
+            "pipeline": pipeline.stats(),
+            "writer": writer.stats(),
+            "nmt": nmt_stats,
+            "preprocess": preprocess_stats,
+        }
+        if self.translation_memory is not None:
+            stats["translation_memory"] = self.translation_memory.stats()
+        if self.detector_scheduler is not None:
+            stats["detector_batching"] = self.detector_scheduler.stats()
+        if self.nmt_service is not None:
+            stats["nmt_service"] = self.nmt_service.stats()
+        stats["translation_models"] = self.translation_models.stats()
+        # Only a convenience with concurrent calls: the last call to finish wins
+        self.last_stats = stats
+        print(
+            f"Translated {file_id} pages in {elapsed:.2f}s "
+            f"({stats['pages_per_sec']:.3f} pages/sec on {self.config.device})"
+        )
+        print(
+            f"Wrote {writer.num_bytes} bytes with {writer.file_writes} file writes "
+            f"in {writer.write_seconds:.2f}s"
+        )
+        if preprocess_stats:
+            print(
+                f"Preprocessing allocated {preprocess_stats['allocations']} page buffers, "
+                f"{preprocess_stats['bytes'] / 2**20:.1f} MiB"
+            )
+        if nmt_stats:
+            print(
+                f"Merged {nmt_stats.get('layout_blocks', 0)} layout blocks into "
+                f"{nmt_stats['blocks']} translation units, split into {nmt_stats['chunks']} chunks, "
+                f"{nmt_stats['input_tokens'] / max(1, nmt_stats['sequences']):.1f} tokens per "
+                f"translated chunk"
+            )
+            print(
+                f"Stopped {nmt_stats['loops_stopped']}/{nmt_stats['sequences']} looping chunks, "
+                f"{nmt_stats['decode_steps']}/{nmt_stats['decode_budget']} decoding steps used"
+            )
+        if self.detector_scheduler is not None:
+            batching = stats["detector_batching"]
+            print(
+                f"Layout model: {batching['mean_batch_size']:.1f} pages per batch "
+                f"(max {batching['max_batch_size']}) over {batching['batches']} batches, "
+                f"{batching['mean_queue_seconds'] * 1000:.1f} ms mean queueing delay "
+                f"(max {batching['max_queue_seconds'] * 1000:.1f} ms), all documents since start"
+            )
+        if self.nmt_service is not None:
+            service = stats["nmt_service"]
+            print(
+                f"Translation service: {service['mean_batch_size']:.1f} chunks per batch "
+                f"({service['fill_ratio']:.0%} of the slots, {service['padding_efficiency']:.0%} real tokens), "
+                f"chunk latency p50 {service['latency_p50_seconds']:.2f}s p90 {service['latency_p90_seconds']:.2f}s "
+                f"p99 {service['latency_p99_seconds']:.2f}s, {service['queue_depth']} chunks queued"
+            )
+        for page_id, path in enumerate(page_paths):
+            print(f"Page {page_id:03}: {path}")
+        for name, stage_stats in stats["pipeline"].items():
+            print(
+                f"Stage {name}: {stage_stats['items']} batches, "
+                f"{stage_stats['occupancy']:.0%} occupancy, "
+                f"{stage_stats['wait_seconds']:.2f}s starved, "
+                f"{stage_stats['blocked_seconds']:.2f}s blocked"
+            )
+        return stats
+
+    def _open_pdf(self, input_path: Union[Path, bytes]) -> fitz.Document:
+        if isinstance(input_path, bytes):
+            return fitz.open(stream=input_path, filetype="pdf")
+        return fitz.open(input_path)
+
+    def _rasterize(
+        self,
+        doc: fitz.Document,
+        input_path: Union[Path, bytes],
+        first_page: int,
+        last_page: int,
+    ) -> Tuple[List[np.ndarray], List[Optional[PageText]]]:
+        """Render the pages first_page to last_page (excluded) of doc.
+
+        With the fitz renderer the page images are read-only arrays over
+        the rendered buffers, no PIL image is created.
+        """
+        dpi = self.config.dpi
+        list_page_texts = [
+            PageText.from_page(page) if self.config.use_text_layer else None
+            for page in doc.pages(first_page, last_page)
+        ]
 
-        # Batch processing
-        idx = 0
-        file_id = 0
-        batch_size = 8
-
-        for _ in tqdm(range(math.ceil(len(pdf_images) / batch_size))):
-            image_list = pdf_images[idx:idx + batch_size]
-            if not reached_references:
-                image_list, reached_references = self._translate_multiple_pages(
-                    image_list=image_list,
-                    reached_references=reached_references,
+        if self.config.renderer == "poppler":
+            kwargs = dict(
+                dpi=dpi,
+                first_page=first_page + 1,
+                last_page=last_page,
+                poppler_path=self.config.poppler_path,
+            )
+            if isinstance(input_path, bytes):
+                image_list = convert_from_bytes(input_path, **kwargs)
+            else:
+                image_list = convert_from_path(input_path, **kwargs)
+            image_list = [np.asarray(image.convert("RGB")) for image in image_list]
+        else:
+            image_list = []
+            for page in doc.pages(first_page, last_page):
+                pix = page.get_pixmap(dpi=dpi, alpha=False)
+                image_list.append(
+                    np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
                 )
 
-                # Save translated pages to PDF files
-                for translated_image, original_image in image_list:
-                    saved_output_path = os.path.join(output_path, f"{file_id:03}.pdf")
-                    with fitz.open() as pdf_writer:
-                        pil_image = Image.fromarray(translated_image).convert("RGB")
-                        pil_image.save(saved_output_path)
-                        pdf_files.append(saved_output_path)
-                    file_id += 1
+        return image_list, list_page_texts
+
+    def _rasterize_stage(self, doc, input_path, item):
+        item["image_list"], item["page_texts"] = self._rasterize(
+            doc, input_path, item["first_page"], item["last_page"]
+        )
+        return item
+
+    def _detect_stage(self, context, item):
+        item["detections"] = self._detect_layout(context, item.pop("image_list"))
+        return item
+
+    def _ocr_stage(self, item):
+        new_list_boxes, new_list_labels, list_original_images, list_meta = item.pop("detections")
+        list_rats = [meta.ratio for meta in list_meta]
+        list_pages, item["reached_references"] = self._ocr_module(
+            new_list_boxes, new_list_labels, list_original_images, item.pop("page_texts"), list_rats
+        )
+        item["page_paths"] = [path for _, _, path in list_pages]
+        item["pages"] = [
+            (original_image, list_blocks, abstract_top)
+            for original_image, (list_blocks, abstract_top, _) in zip(list_original_images, list_pages)
+        ]
+        return item
+
+    def _translate_stage(self, context, item):
+        # Translate the units of all pages at once, then scatter them back to the blocks
+        list_units = []
+        list_texts = []
+        for _, list_blocks, _ in item["pages"]:
+            if self.config.merge_blocks:
+                units = group_blocks(
+                    [text for text, _ in list_blocks],
+                    [box for _, box in list_blocks],
+                    max_gap=self.config.block_merge_max_gap * self.config.dpi / 72,
+                )
+            else:
+                units = [[i] for i in range(len(list_blocks))]
+            list_units.append(units)
+            list_texts += [" ".join(list_blocks[i][0] for i in unit) for unit in units]
+        list_translated_units = self._translate_batch(context, list_texts)
 
-            idx += batch_size
+        # A merged unit is spread over its blocks in proportion to their area
+        item["translated_texts"] = []
+        offset = 0
+        for (_, list_blocks, _), units in zip(item["pages"], list_units):
+            page_translated_texts = [None] * len(list_blocks)
+            for unit, translated_text in zip(units, list_translated_units[offset:offset + len(units)]):
+                areas = [
+                    (box[2] - box[0]) * (box[3] - box[1]) for box in (list_blocks[i][1] for i in unit)
+                ]
+                for i, part in zip(unit, split_by_area(translated_text, areas)):
+                    # A block left without a part of the translation keeps its own text
+                    page_translated_texts[i] = part or list_blocks[i][0]
+            offset += len(units)
+            item["translated_texts"] += page_translated_texts
+        context.count(
+            context.nmt_stats, {"layout_blocks": sum(len(list_blocks) for _, list_blocks, _ in item["pages"])}
+        )
+        return item
 
-        # Merge all PDFs if required
-        if merge:
-            self._merge_pdfs(pdf_files)
+    def _render_stage(self, context, item):
+        list_translated_texts = item.pop("translated_texts")
+        item["translated_images"] = []
+        item["vector_blocks"] = []
+        offset = 0
+        for original_image, list_blocks, abstract_top in item.pop("pages"):
+            page_translated_texts = list_translated_texts[offset:offset + len(list_blocks)]
+            offset += len(list_blocks)
+            if self.config.output_mode == "vector":
+                item["vector_blocks"].append(self._layout_vector_page(
+                    context, list_blocks, page_translated_texts, abstract_top
+                ))
+            else:
+                item["translated_images"].append(self._render_page(
+                    context, original_image, list_blocks, page_translated_texts, abstract_top
+                ))
+        return item
 
     def _load_init(self):
         """Backend function for loading models.
 
         Called in the constructor.
         Load the layout model, OCR model, translation model and font.
+        The time spent loading each of them is kept in load_stats.
         """
+        start_time = time.perf_counter()
         self.font_ja = ImageFont.truetype(
-           os.path.join(os.getcwd(), "Source Han Serif CN Light.otf"),
+            os.path.join(self.config.font_dir, "Source Han Serif CN Light.otf"),
             size=self.FONT_SIZE_JAPANESE,
         )
         self.font_vi = ImageFont.truetype(
-            os.path.join(os.getcwd(), "AlegreyaSans-Regular.otf"),
+            os.path.join(self.config.font_dir, "AlegreyaSans-Regular.otf"),
             size=self.FONT_SIZE_VIETNAMESE,
         )
         
         # Detection model: PubLayNet
+        detector_start_time = time.perf_counter()
         self.num_classes = len(CATEGORIES2LABELS.keys())
-        self.pub_model = get_instance_segmentation_model(self.num_classes)
+        if self.config.detector_backend == "onnx":
+            # onnxruntime is only needed by this backend
+            from Model.onnx_detector import OnnxDetector
 
-        if os.path.exists(MODEL_PATH):
-            self.checkpoint_path = MODEL_PATH
+            if not os.path.exists(self.config.detector_onnx_path):
+                raise Exception(
+                    f"ONNX layout model not found at {self.config.detector_onnx_path}, "
+                    "export it with python -m Model.onnx_detector."
+                )
+            self.pub_model = OnnxDetector(
+                self.config.detector_onnx_path,
+                num_threads=self.config.num_threads,
+                num_interop_threads=self.config.num_interop_threads,
+            )
         else:
-            raise Exception("Model weights not found.")
+            self.pub_model = get_instance_segmentation_model(
+                self.num_classes,
+                box_only=self.config.detector_mode == "box",
+                **get_layout_model_kwargs(self.config),
+            )
+
+            if os.path.exists(self.config.model_path):
+                self.checkpoint_path = self.config.model_path
+            else:
+                raise Exception(f"Model weights not found at {self.config.model_path}.")
 
-        assert os.path.exists(self.checkpoint_path)
-        checkpoint = torch.load(self.checkpoint_path, map_location='cuda:0')
-        self.pub_model.load_state_dict(checkpoint['model'])
-        self.pub_model = self.pub_model.to("cuda")
-        self.pub_model.eval()
+            load_checkpoint(self.pub_model, self.checkpoint_path, box_only=self.config.detector_mode == "box")
+            self.pub_model = self.pub_model.to(self.device)
+            if not self.config.use_cuda and self.config.channels_last:
+                # Convolutions in the backbone are faster in NHWC on CPU
+                self.pub_model = self.pub_model.to(memory_format=torch.channels_last)
+            self.pub_model.eval()
+            self.pub_model = prepare_model(self.pub_model, self.config.detector_precision, self.device)
+        self.detector_scheduler = None
+        if self.config.detector_batch_wait_ms > 0:
+            # The pages of the documents translated at the same time share forward passes
+            self.detector_scheduler = BatchScheduler(
+                self._run_detector,
+                max_batch_size=self.config.detector_max_batch_size,
+                max_wait_seconds=self.config.detector_batch_wait_ms / 1000,
+                name="detector",
+            )
+        detector_seconds = time.perf_counter() - detector_start_time
 
         # Recognition model: PaddleOCR
         # self.ocr_model = PaddleOCR(ocr=True, use_gpu=True, lang="en", ocr_version="PP-OCRv4")
-        self.ocr_model = easyocr.Reader(['en'], gpu=True)
+        # EasyOCR is loaded on first use, digital-born PDFs never need it
+        self._ocr_model = None
         
-        # Translation model
-        # self.translate_model_ja = AutoModelForSeq2SeqLM.from_pretrained("Helsinki-NLP/opus-mt-en-jap").to("cuda:0")
-        # self.translate_tokenizer_ja = AutoTokenizer.from_pretrained("Helsinki-NLP/opus-mt-en-jap")
-        
-        self.translate_model_vi = AutoModelForSeq2SeqLM.from_pretrained("VietAI/envit5-translation").to("cuda:0")
-        self.translate_tokenizer_vi = AutoTokenizer.from_pretrained("VietAI/envit5-translation")
-
-        self.transform = transforms.Compose([
-            transforms.ToPILImage(),
-            transforms.ToTensor()
-        ])
-
-    def _crop_img(self, box, ori_img):
-        new_box_0 = int(box[0] / self.rat) - 20
-        new_box_1 = int(box[1] / self.rat) - 10
-        new_box_2 = int(box[2] / self.rat) + 20
-        new_box_3 = int(box[3] / self.rat) + 10
+        # Translation models: loaded on first use of their language, only
+        # the preloaded ones count in the startup time
+        translation_start_time = time.perf_counter()
+        self.translation_models = ModelRegistry(
+            self.config.nmt_models,
+            self._load_translation_model,
+            memory_budget_bytes=self.config.nmt_memory_budget_mb * 2**20,
+        )
+        for language in self.config.nmt_preload:
+            self.translation_models.get(language)
+        translation_seconds = time.perf_counter() - translation_start_time
+
+        # The chunks of the documents translated at the same time share generate calls
+        self.nmt_service = None
+        if self.config.nmt_batch_wait_ms > 0:
+            self.nmt_service = NmtService(
+                self._translation_model,
+                self.device,
+                max_batch_tokens=self.config.nmt_max_batch_tokens,
+                max_batch_size=self.config.nmt_max_batch_size,
+                max_wait_seconds=self.config.nmt_batch_wait_ms / 1000,
+                max_language_batches=self.config.nmt_language_batches,
+                precision=self.config.nmt_precision,
+                generate_kwargs=self._generate_kwargs(),
+                pin=self.translation_models.pin,
+                unpin=self.translation_models.unpin,
+            )
+
+        # Translation memory: repeated chunks cost a lookup instead of a generate call
+        self.translation_memory = None
+        if self.config.use_translation_memory:
+            self.translation_memory = TranslationMemory(
+                path=self.config.translation_memory_path,
+                max_entries=self.config.translation_memory_max_entries,
+                lru_size=self.config.translation_memory_lru_size,
+            )
+            if self.config.translation_memory_corpus:
+                num_entries = self.translation_memory.warm(
+                    self.config.translation_memory_corpus, self.config.nmt_models
+                )
+                print(f"Pre-warmed translation memory with {num_entries} entries")
+
+        self.load_stats = {
+            "seconds": time.perf_counter() - start_time,
+            "detector_seconds": detector_seconds,
+            "translation_seconds": translation_seconds,
+            "translation_bytes": self.translation_models.resident_bytes(),
+        }
+        if isinstance(self.pub_model, torch.nn.Module):
+            self.load_stats["detector_bytes"] = model_size_bytes(self.pub_model)
+        print(
+            f"Loaded models in {self.load_stats['seconds']:.2f}s "
+            f"(layout model {detector_seconds:.2f}s, translation models {translation_seconds:.2f}s), "
+            f"translation models {self.config.nmt_precision} "
+            f"{self.load_stats['translation_bytes'] / 2**20:.0f} MiB "
+            f"({', '.join(self.config.nmt_preload) or 'none'} preloaded)"
+        )
+
+    def _load_translation_model(self, model_name: str):
+        """Load a translation model and its tokenizer, ready for inference."""
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(self.device)
+        model.eval()
+        model = prepare_model(model, self.config.nmt_precision, self.device)
+        # Shared by the documents translated concurrently
+        tokenizer = SharedTokenizer(AutoTokenizer.from_pretrained(model_name))
+        return model, tokenizer
+
+    @property
+    def ocr_model(self) -> easyocr.Reader:
+        with self._ocr_lock:
+            if self._ocr_model is None:
+                self._ocr_model = easyocr.Reader(['en'], gpu=self.config.use_cuda)
+        return self._ocr_model
+
+    def _crop_img(self, box, ori_img, rat):
+        new_box_0 = max(int(box[0] / rat) - 20, 0)
+        new_box_1 = max(int(box[1] / rat) - 10, 0)
+        new_box_2 = min(int(box[2] / rat) + 20, ori_img.shape[1])
+        new_box_3 = min(int(box[3] / rat) + 10, ori_img.shape[0])
         temp_img = ori_img[new_box_1:new_box_3, new_box_0:new_box_2]
         box = [new_box_0, new_box_1, new_box_2, new_box_3]
         return temp_img, box
 
-    def _ocr_module(self, list_boxes, list_labels_idx, ori_img):
-        original_image = copy.deepcopy(ori_img)
-        list_labels = list(map(lambda y: CATEGORIES2LABELS[y.item()], list_labels_idx))
-        list_masks = list(map(lambda x: x == "text", list_labels))
-        list_boxes_filtered = list_boxes[list_masks]
-        list_images_filtered = [original_image] * len(list_boxes_filtered)
-
-        results = list(map(self._crop_img, list_boxes_filtered, list_images_filtered))
+    def _read_boxes(self, list_boxes_per_page, list_original_images, list_page_texts, list_rats):
+        """Read the text inside the boxes of a batch of pages.
 
-        if len(results) > 0:
-            list_temp_images, list_new_boxes = [row[0] for row in results], [row[1] for row in results]
-            
-            list_ocr_results = list(map(lambda x: np.array(x, dtype=object)[:, 1] if len(x) > 0 else None, 
-                                        list(map(lambda x: self.ocr_model.readtext(x), list_temp_images))))
+        The embedded text layer is used when available. The boxes it does
+        not cover are OCR'd together in one batched call for the whole batch,
+        either crop by crop or, with ocr_mode="page", once per page.
 
-            for ocr_results, box in zip(list_ocr_results, list_new_boxes):
-                if ocr_results is not None:
-                    ocr_text = " ".join(ocr_results)
-                    if len(ocr_text) > 1:
-                        text = re.sub(r"\n|\t|\[|\]|\/|\|", " ", ocr_text)
-                        translated_text = self._translate(text)
-                        translated_text = re.sub(r"\n|\t|\[|\]|\/|\|", " ", translated_text)
-
-                        # if most characters in translated text are not 
-                        # japanese characters, skip
-                        if self.language == "ja":
-                            if len(
-                                re.findall(
-                                    r"[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF\u3400-\u4DBF]",
-                                    translated_text,
-                                )
-                            ) > 0.8 * len(translated_text):
-                                print("skipped")
-                                continue
-                        
-                        # for VietAI/envit5-translation, replace "vi"
-                        if self.language == "vi":
-                            translated_text = translated_text.replace("vi: ", "")
-                            translated_text = translated_text.replace("vi ", "")
-                            translated_text = translated_text.strip()
-                            
-                        if self.language == "ja":
-                            if self._repeated_substring(translated_text): # Check repeated substring
-                                processed_text = fw_fill_ja(
-                                    text,
-                                    width=int(
-                                        (box[2] - box[0]) / (self.FONT_SIZE_JAPANESE / 2)
-                                    )
-                                    + 1,
-                                )
-                            else:
-                                processed_text = fw_fill_ja(
-                                    translated_text,
-                                    width=int(
-                                        (box[2] - box[0]) / (self.FONT_SIZE_JAPANESE / 2)
-                                    )
-                                    + 1,
-                                )
-                        else:
-                            if self._repeated_substring(translated_text):
-                                processed_text = fw_fill_vi(
-                                    text,
-                                    width=int(
-                                        (box[2] - box[0]) / (self.FONT_SIZE_VIETNAMESE / 2)
-                                    )
-                                    + 1,
-                                )
-                            else:
-                                processed_text = fw_fill_vi(
-                                    translated_text,
-                                    width=int(
-                                        (box[2] - box[0]) / (self.FONT_SIZE_VIETNAMESE / 2)
-                                    )
-                                    + 1,
-                                )
-
-                        new_block = Image.new(
-                            "RGB",
-                            (
-                                box[2] - box[0],
-                                box[3] - box[1],
-                            ),
-                            color=(255, 255, 255),
-                        )
-                        draw = ImageDraw.Draw(new_block)
-                        if self.language == "ja":
-                            draw.text(
-                                (0, 0),
-                                text=processed_text,
-                                font=self.font_ja,
-                                fill=(0, 0, 0),
-                            )
-                        else:
-                            draw.text(
-                                (0, 0),
-                                text=processed_text,
-                                font=self.font_vi,
-                                fill=(0, 0, 0),
-                            )
-                        
-                        new_block = np.array(new_block)
-                        original_image[
-                            int(box[1]) : int(box[3]),
-                            int(box[0]) : int(box[2]),
-                        ] = new_block
-                else:
-                    continue
+        Parameters
+        ----------
+        list_boxes_per_page: List[torch.Tensor]
+            Boxes detected by the layout model, in resized coordinates.
+        list_original_images: List[np.ndarray]
+            Original page images.
+        list_page_texts: List[Optional[PageText]]
+            Text layer of each page, None to OCR every box of the page.
+        list_rats: List[float]
+            Resize ratio between the original and the detector images.
 
-        reached_references = False
+        Returns
+        -------
+        Tuple[List[List[Optional[List[str]]]], List[List[List[int]]], List[int]]
+            For each page: the lines read in each box (None if empty),
+            the padded boxes in original image coordinates,
+            and the number of boxes that went through OCR.
+        """
+        scale = self.config.dpi / 72
+        list_lines_per_page = []
+        list_new_boxes_per_page = []
+        list_num_ocr = []
+        ocr_crops = []
+        ocr_targets = []
+        for page_index, (list_boxes, ori_img, page_text, rat) in enumerate(
+            zip(list_boxes_per_page, list_original_images, list_page_texts, list_rats)
+        ):
+            list_new_boxes = [self._crop_img(box, ori_img, rat)[1] for box in list_boxes]
+            list_lines = [None] * len(list_new_boxes)
+            num_ocr = 0
+            for i, (box, new_box) in enumerate(zip(list_boxes, list_new_boxes)):
+                if page_text is not None:
+                    text = page_text.text_in_box([float(v) / rat for v in box], scale)
+                    if text:
+                        list_lines[i] = [text]
+                        continue
+                ocr_crops.append((page_index, new_box))
+                ocr_targets.append((page_index, i))
+                num_ocr += 1
+            list_lines_per_page.append(list_lines)
+            list_new_boxes_per_page.append(list_new_boxes)
+            list_num_ocr.append(num_ocr)
 
-        # Check title "Reference" or "References", if so then stop
-        list_title_masks = list(map(lambda x: x == "title", list_labels))
-        list_boxes_filtered = list_boxes[list_title_masks]
-        list_images_filtered = [original_image] * len(list_boxes_filtered)
-
-        results = list(map(self._crop_img, list_boxes_filtered, list_images_filtered))
-        if len(results) > 0:
-            list_temp_images = [row[0] for row in results]
-            list_title_ocr_results = list(map(lambda x: np.array(x, dtype=object)[:, 1] if len(x) > 0 else None, 
-                                        list(map(lambda x: self.ocr_model.readtext(x), list_temp_images))))
-            if len(list_title_ocr_results) > 0:
-                for i, (result, box) in enumerate(zip(list_title_ocr_results, list_boxes_filtered)):
-                    if result is not None:
-                        if result[0].lower() in ["references", "reference"]:
-                            reached_references = True
-                        elif result[0].lower() == "abstract":
-                            # Use the original Title and Authors, skip translating them
-                            new_box_1 = int(box[1] / self.rat)
-                            original_image[
-                                int(0) : int(new_box_1),
-                                int(0) : int(original_image.shape[1]),
-                            ] = ori_img[
-                                int(0) : int(new_box_1),
-                                int(0) : int(ori_img.shape[1]),
-                            ]
-                    
-        return original_image, reached_references
-    
-    def _preprocess_image(self, image):
-        ori_img = np.array(image)
-        img = ori_img[:, :, ::-1].copy()
-        
-        # Get the ratio to resize
-        self.rat = 1000 / img.shape[0]
+        if ocr_crops:
+            readtext = page_readtext if self.config.ocr_mode == "page" else batched_readtext
+            list_ocr_results = readtext(
+                self.ocr_model,
+                list_original_images,
+                ocr_crops,
+                batch_size=self.config.ocr_batch_size,
+            )
+            for (page_index, i), ocr_results in zip(ocr_targets, list_ocr_results):
+                if len(ocr_results) > 0:
+                    list_lines_per_page[page_index][i] = ocr_results
 
-        img = cv2.resize(img, None, fx=self.rat, fy=self.rat)
-        img = self.transform(img).cuda()
+        return list_lines_per_page, list_new_boxes_per_page, list_num_ocr
 
-        return [img, ori_img]
-    
-    def _translate_multiple_pages(
-        self,
-        image_list: List[Image.Image],
-        reached_references: bool,
-    ) -> Tuple[np.ndarray, np.ndarray, bool]:
-        """Translate one page of the PDF file.
+    def _ocr_module(self, list_boxes_per_page, list_labels_per_page, list_original_images, list_page_texts, list_rats):
+        """Read the text blocks and titles of a batch of pages.
 
-        There are some heuristics to clean-up the results of translation:
-            1. Remove newlines, tabs, brackets, slashes, and pipes
-            2. Reject the result if there are few Japanese characters
-            3. Skip the translation if the text block has only one line
+        Titles are read first to find the references section, so that the
+        text blocks of the pages after it are never read.
 
         Parameters
         ----------
-        image_list: List[Image.Image]
-            Image of the page
-        reached_references: bool
-            Whether the references section has been reached.
+        list_boxes_per_page: List[torch.Tensor]
+            Boxes detected by the layout model, in resized coordinates.
+        list_labels_per_page: List[torch.Tensor]
+            Labels of the boxes.
+        list_original_images: List[np.ndarray]
+            Original page images.
+        list_page_texts: List[Optional[PageText]]
+            Text layer of each page. Pages with too little embedded text
+            are considered scanned and go through OCR.
+        list_rats: List[float]
+            Resize ratio between the original and the detector images.
 
         Returns
         -------
-        Tuple[np.ndarray, np.ndarray, bool]
-            Translated image, original image,
+        Tuple[List[Tuple[List[Tuple[str, List[int]]], Optional[int], str]], bool]
+            For each page up to the references: the (text, box) pairs of the
+            text blocks to be translated, the top of the "Abstract" title if
+            any, and how the page was read ("text_layer", "ocr" or "mixed");
             and whether the references section has been reached.
         """
-        results = list(map(self._preprocess_image, image_list))
-        new_list_images, list_original_images = [row[0] for row in results], [row[1] for row in results]
-        with torch.no_grad():
-            predictions = self.pub_model(new_list_images)
+        list_page_texts = [
+            page_text if page_text is not None and page_text.has_text(self.config.text_layer_min_chars) else None
+            for page_text in list_page_texts
+        ]
+        list_labels_per_page = [
+            list(map(lambda y: CATEGORIES2LABELS[y.item()], list_labels_idx))
+            for list_labels_idx in list_labels_per_page
+        ]
 
-        list_masks = list(map(lambda x : x["scores"] >= 0.7, predictions))
-        new_list_boxes = list(map(lambda x, y : x['boxes'][y,:], predictions, list_masks))
-        new_list_labels = list(map(lambda x, y : x["labels"][y], predictions, list_masks))   
+        # Check title "Reference" or "References", if so then stop
+        list_title_boxes = [
+            list_boxes[list(map(lambda x: x == "title", list_labels))]
+            for list_boxes, list_labels in zip(list_boxes_per_page, list_labels_per_page)
+        ]
+        list_title_lines, _, list_num_title_ocr = self._read_boxes(
+            list_title_boxes, list_original_images, list_page_texts, list_rats
+        )
 
-        list_returned_images = []
         reached_references = False
-        for one_image_boxes, one_image_labels, original_image in zip(new_list_boxes, new_list_labels, 
-                                                                                list_original_images):
-            one_translated_image, reached_references = self._ocr_module(one_image_boxes, one_image_labels, original_image)
-            list_returned_images.append([one_translated_image, original_image])
+        list_abstract_tops = []
+        for list_lines, list_boxes_filtered, rat in zip(list_title_lines, list_title_boxes, list_rats):
+            abstract_top = None
+            for result, box in zip(list_lines, list_boxes_filtered):
+                if result is not None:
+                    if result[0].strip().lower() in ["references", "reference"]:
+                        reached_references = True
+                    elif result[0].strip().lower() == "abstract":
+                        # Use the original Title and Authors, skip translating them
+                        new_box_1 = int(box[1] / rat)
+                        abstract_top = max(abstract_top or 0, new_box_1)
+            list_abstract_tops.append(abstract_top)
             if reached_references:
                 break
 
-        return list_returned_images, reached_references
+        num_pages = len(list_abstract_tops)
+        list_text_boxes = [
+            list_boxes[list(map(lambda x: x == "text", list_labels))]
+            for list_boxes, list_labels in zip(list_boxes_per_page[:num_pages], list_labels_per_page)
+        ]
+        list_text_lines, list_new_boxes_per_page, list_num_text_ocr = self._read_boxes(
+            list_text_boxes, list_original_images[:num_pages], list_page_texts[:num_pages], list_rats[:num_pages]
+        )
+
+        list_pages = []
+        for page_index in range(num_pages):
+            list_blocks = []
+            for lines, box in zip(list_text_lines[page_index], list_new_boxes_per_page[page_index]):
+                if lines is not None:
+                    ocr_text = " ".join(lines)
+                    if len(ocr_text) > 1:
+                        text = re.sub(r"\n|\t|\[|\]|\/|\|", " ", ocr_text)
+                        list_blocks.append((text, box))
+
+            num_ocr = list_num_title_ocr[page_index] + list_num_text_ocr[page_index]
+            if list_page_texts[page_index] is None:
+                path = "ocr"
+            elif num_ocr == 0:
+                path = "text_layer"
+            else:
+                path = "mixed"
+            list_pages.append((list_blocks, list_abstract_tops[page_index], path))
+
+        return list_pages, reached_references
+
+    def _postprocess_translation(self, context: TranslationContext, text: str, translated_text: str) -> Optional[str]:
+        """Clean up the translation of one block before drawing it.
+
+        There are some heuristics to clean-up the results of translation:
+            1. Remove newlines, tabs, brackets, slashes, and pipes
+            2. Reject the result if there are few Japanese characters
+            3. Fall back to the source text if the translation repeats itself
+
+        Returns
+        -------
+        Optional[str]
+            Text to draw in the block, None to leave the block untouched.
+        """
+        translated_text = re.sub(r"\n|\t|\[|\]|\/|\|", " ", translated_text)
+
+        # if most characters in translated text are not 
+        # japanese characters, skip
+        if context.language == "ja":
+            if len(
+                re.findall(
+                    r"[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF\u3400-\u4DBF]",
+                    translated_text,
+                )
+            ) > 0.8 * len(translated_text):
+                print("skipped")
+                return None
+        
+        # for VietAI/envit5-translation, replace "vi"
+        if context.language == "vi":
+            translated_text = translated_text.replace("vi: ", "")
+            translated_text = translated_text.replace("vi ", "")
+            translated_text = translated_text.strip()
 
-    def _translate(self, text: str) -> str:
-        """Translate the text in PDF files using 
-        the translation model.
+        if self._repeated_substring(translated_text): # Check repeated substring
+            return text
+        return translated_text
 
-        If the text is too long, it will be splited by rule-based method
-        so that each sentence should be within 450 characters.
+    def _render_page(self, context, ori_img, list_blocks, list_translated_texts, abstract_top):
+        """Draw the translated text blocks over a copy of the page.
 
         Parameters
         ----------
-        text: str
-            Text to be translated.
+        context: TranslationContext
+            State of the document being translated.
+        ori_img: np.ndarray
+            Original page image.
+        list_blocks: List[Tuple[str, List[int]]]
+            The (text, box) pairs returned by _ocr_module.
+        list_translated_texts: List[str]
+            Translation of each block.
+        abstract_top: Optional[int]
+            Everything above this row is copied from the original page.
 
         Returns
         -------
-        str
-            Translated text.
+        np.ndarray
+            Translated page image.
         """
-        texts = self._split_text(text, 450)
-
-        translated_texts = []
-        for i, t in enumerate(texts):
-            http_res = ("http" in t) or ("https" in t)
-            if not http_res:
-                if self.language == "ja":
-                    inputs = self.translate_tokenizer_ja(t, return_tensors="pt").input_ids.to(
-                        "cuda"
+        original_image = copy.deepcopy(ori_img)
+        for (text, box), translated_text in zip(list_blocks, list_translated_texts):
+            translated_text = self._postprocess_translation(context, text, translated_text)
+            if translated_text is None:
+                continue
+
+            if context.language == "ja":
+                processed_text = fw_fill_ja(
+                    translated_text,
+                    width=int(
+                        (box[2] - box[0]) / (self.FONT_SIZE_JAPANESE / 2)
                     )
-                    outputs = self.translate_model_ja.generate(inputs, max_length=512)
-                    res = self.translate_tokenizer_ja.decode(outputs[0], skip_special_tokens=True)
-                else:
-                    inputs = self.translate_tokenizer_vi(t, return_tensors="pt").input_ids.to(
-                        "cuda"
+                    + 1,
+                )
+            else:
+                processed_text = fw_fill_vi(
+                    translated_text,
+                    width=int(
+                        (box[2] - box[0]) / (self.FONT_SIZE_VIETNAMESE / 2)
                     )
-                    outputs = self.translate_model_vi.generate(inputs, max_length=512)
-                    res = self.translate_tokenizer_vi.decode(outputs[0], skip_special_tokens=True)
+                    + 1,
+                )
+
+            new_block = Image.new(
+                "RGB",
+                (
+                    box[2] - box[0],
+                    box[3] - box[1],
+                ),
+                color=(255, 255, 255),
+            )
+            draw = ImageDraw.Draw(new_block)
+            if context.language == "ja":
+                draw.text(
+                    (0, 0),
+                    text=processed_text,
+                    font=self.font_ja,
+                    fill=(0, 0, 0),
+                )
             else:
-                res = t
+                draw.text(
+                    (0, 0),
+                    text=processed_text,
+                    font=self.font_vi,
+                    fill=(0, 0, 0),
+                )
             
-            # skip translated text at first
-            if self.language == "ja" and res.startswith("「この版"):
+            new_block = np.array(new_block)
+            original_image[
+                int(box[1]) : int(box[3]),
+                int(box[0]) : int(box[2]),
+            ] = new_block
+
+        if abstract_top is not None:
+            original_image[
+                int(0) : int(abstract_top),
+                int(0) : int(original_image.shape[1]),
+            ] = ori_img[
+                int(0) : int(abstract_top),
+                int(0) : int(ori_img.shape[1]),
+            ]
+
+        return original_image
+
+    def _layout_vector_page(self, context, list_blocks, list_translated_texts, abstract_top):
+        """Compute the text to write over each block of a page in vector mode.
+
+        Returns
+        -------
+        List[Tuple[List[int], str]]
+            (box, text) pairs, box in pixels of the rendered page.
+        """
+        list_vector_blocks = []
+        for (text, box), translated_text in zip(list_blocks, list_translated_texts):
+            # Keep the original Title and Authors
+            if abstract_top is not None and box[1] < abstract_top:
                 continue
+            translated_text = self._postprocess_translation(context, text, translated_text)
+            if translated_text is not None:
+                list_vector_blocks.append((box, translated_text))
+        return list_vector_blocks
+
+    def _write_vector_page(self, context: TranslationContext, page: fitz.Page, list_vector_blocks) -> None:
+        """Replace the source text of the blocks by vector translated text."""
+        scale = self.config.dpi / 72
+        list_rects = [fitz.Rect(*box) / scale for box, _ in list_vector_blocks]
+        redact_rects(page, list_rects)
+        if context.language == "ja":
+            fontfile = os.path.join(self.config.font_dir, "Source Han Serif CN Light.otf")
+            fontsize = self.FONT_SIZE_JAPANESE / scale
+        else:
+            fontfile = os.path.join(self.config.font_dir, "AlegreyaSans-Regular.otf")
+            fontsize = self.FONT_SIZE_VIETNAMESE / scale
+        for rect, (_, text) in zip(list_rects, list_vector_blocks):
+            insert_text_fit(page, rect, text, f"translation-{context.language}", fontfile, fontsize)
+
+    def _detect_layout(self, context, image_list):
+        """Run the layout model on a batch of pages.
+
+        Returns
+        -------
+        Tuple[List[torch.Tensor], List[torch.Tensor], List[np.ndarray], List[PageMeta]]
+            Boxes and labels kept for each page, original page images
+            and their resize ratio and size.
+        """
+        list_original_images = [np.asarray(image) for image in image_list]
+        counters = {}
+        new_list_images, list_meta = preprocess_pages(list_original_images, self.device, counters=counters)
+        context.count(context.preprocess_stats, counters)
+        predictions = (self.detector_scheduler or self._run_detector)(new_list_images)
+
+        list_masks = list(map(lambda x : x["scores"] >= self.config.layout_score_threshold, predictions))
+        new_list_boxes = list(map(lambda x, y : x['boxes'][y,:], predictions, list_masks))
+        new_list_labels = list(map(lambda x, y : x["labels"][y], predictions, list_masks))   
+        return new_list_boxes, new_list_labels, list_original_images, list_meta
+    
+    def _run_detector(self, images: List[torch.Tensor]) -> List[Dict[str, torch.Tensor]]:
+        """Run the layout model on preprocessed pages, possibly of several documents."""
+        with torch.inference_mode(), autocast(self.config.detector_precision, self.device):
+            predictions = self.pub_model(images)
+        # bf16 boxes would lose pixels on large pages
+        return [{k: v.float() if v.is_floating_point() else v for k, v in p.items()} for p in predictions]
+
+    def _translate_batch(self, context: TranslationContext, list_texts: List[str]) -> List[str]:
+        """Translate several texts with batched generate calls.
+
+        Every text is split into chunks of whole sentences within the
+        token budget of the model, the chunks of all texts are translated
+        together in length buckets, and the results are joined back per text.
+
+        Parameters
+        ----------
+        context: TranslationContext
+            State of the document being translated.
+        list_texts: List[str]
+            Texts to be translated.
+
+        Returns
+        -------
+        List[str]
+            Translated texts, in the same order as list_texts.
+        """
+        _, tokenizer, _ = self._translation_model(context.language)
+        list_chunks = [self._split_text(text, tokenizer) for text in list_texts]
+        context.count(context.nmt_stats, {"blocks": len(list_texts), "chunks": sum(map(len, list_chunks))})
+
+        # Links are kept as they are
+        pending = [
+            t for chunks in list_chunks for t in chunks
+            if not (("http" in t) or ("https" in t))
+        ]
+        translated = dict(zip(pending, self._generate(context, pending)))
+
+        results = []
+        for chunks in list_chunks:
+            translated_texts = []
+            for t in chunks:
+                res = translated.get(t, t)
+
+                # skip translated text at first
+                if context.language == "ja" and res.startswith("「この版"):
+                    continue
 
-            translated_texts.append(res)
-        return " ".join(translated_texts)
+                translated_texts.append(res)
+            results.append(" ".join(translated_texts))
+        return results
 
-    def _split_text(self, text: str, text_limit_length: int = 448) -> List[str]:
-        """Split text into chunks of sentences within text_limit_length.
+    def _translation_model(self, language: str):
+        """Model, tokenizer and model id of language."""
+        return self.translation_models.get(language)
+
+    def _generate(self, context: TranslationContext, list_chunks: List[str]) -> List[str]:
+        """Run the translation model of the language of context on the chunks."""
+        model, tokenizer, model_id = self._translation_model(context.language)
+        # Identical chunks (running headers, footers...) are translated once
+        unique_chunks = list(dict.fromkeys(list_chunks))
+
+        translated = {}
+        if self.translation_memory is not None:
+            translated = self.translation_memory.get_many(unique_chunks, context.language, model_id)
+        missing_chunks = [t for t in unique_chunks if t not in translated]
+
+        if self.nmt_service is not None:
+            outputs, counters = self.nmt_service.translate(context.language, missing_chunks, key=context)
+        else:
+            counters = {}
+            with autocast(self.config.nmt_precision, self.device):
+                outputs = batched_generate(
+                    model,
+                    tokenizer,
+                    missing_chunks,
+                    self.device,
+                    max_batch_tokens=self.config.nmt_max_batch_tokens,
+                    max_batch_size=self.config.nmt_max_batch_size,
+                    counters=counters,
+                    **self._generate_kwargs(),
+                )
+        context.count(context.nmt_stats, counters)
+
+        # Chunks stopped in a loop keep their source text, and are not remembered
+        finished = [(t, res) for t, res in zip(missing_chunks, outputs) if res is not None]
+        translated.update(finished)
+        if self.translation_memory is not None:
+            self.translation_memory.put_many(finished, context.language, model_id)
+        return [translated.get(t, t) for t in list_chunks]
+
+    def _generate_kwargs(self) -> Dict[str, Any]:
+        """Decoding limits of batched_generate from the configuration."""
+        return {
+            "max_new_tokens_ratio": self.config.nmt_max_new_tokens_ratio,
+            "loop_max_period": self.config.nmt_loop_max_period,
+            "loop_min_repeats": self.config.nmt_loop_min_repeats,
+        }
+
+    def _split_text(self, text: str, tokenizer, max_tokens: Optional[int] = None) -> List[str]:
+        """Split text into chunks of sentences within max_tokens tokens.
 
         Parameters
         ----------
         text: str
             Text to be split.
-        text_limit_length: int
-            Maximum length of each chunk. Defaults to 448.
+        tokenizer:
+            Tokenizer of the translation model.
+        max_tokens: Optional[int]
+            Maximum number of tokens of each chunk.
+            Defaults to nmt_max_chunk_tokens.
 
         Returns
         -------
         List[str]
             List of text chunks,
-            each of which is shorter than text_limit_length.
+            each of which fits in max_tokens tokens.
         """
-        if len(text) < text_limit_length:
-            return [text]
-
-        sentences = text.rstrip().split(". ")
-        sentences = [s + ". " for s in sentences[:-1]] + sentences[-1:]
-        result = []
-        current_text = ""
-        for sentence in sentences:
-            if len(current_text) + len(sentence) < text_limit_length:
-                current_text += sentence
-            else:
-                if current_text:
-                    result.append(current_text)
-                while len(sentence) >= text_limit_length:
-                    result.append(sentence[:text_limit_length - 1])
-                    sentence = sentence[text_limit_length - 1:].lstrip()
-                current_text = sentence
-        if current_text:
-            result.append(current_text)
-        return result
-
-    def _merge_pdfs(self, pdf_files: List[str]) -> None:
-        """Merge the translated PDF files into one file using fitz."""
-        # Ensure the target directory exists
-        output_dir = os.path.join(MEDIA_ROOT, "PDFs")
-        os.makedirs(output_dir, exist_ok=True)  # Create the directory if it doesn't exist
-
-        output_file = os.path.join(output_dir, "fitz_translated.pdf")
-        
-        result = fitz.open()
-        for pdf_file in sorted(pdf_files):
-            with fitz.open(pdf_file) as f:
-                result.insert_pdf(f)
-        result.save(output_file)
-        result.close()
-        print(f"Saved merged PDF to {output_file}")
+        if max_tokens is None:
+            max_tokens = self.config.nmt_max_chunk_tokens
+        return split_by_tokens(text, tokenizer, max_tokens)
 
 if __name__ == "__main__":
     obj = TranslationLayoutRecovery()
     obj.translate_pdf(
         language="ja",
         input_path="1711.07064-1-4.pdf",
-        output_path="outputs/",
-        merge=False,
+        output_file="outputs/1711.07064-1-4_translated_ja.pdf",
     )
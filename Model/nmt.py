@@ -0,0 +1,293 @@
+import bisect
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+
+# A loop must span at least this many tokens, so that short legitimate
+# repeats ("- - -", "0 0 0") are not mistaken for one
+MIN_LOOP_TOKENS = 16
+# Decoding steps allowed on top of the proportional budget, for very short inputs
+MAX_NEW_TOKENS_MARGIN = 16
+
+
+class SharedTokenizer:
+    """Tokenizer that several threads can call at once.
+
+    Fast tokenizers reconfigure their padding and truncation on every
+    call, and fail with "Already borrowed" when two threads do it at the
+    same time. Calls are serialized, everything else is forwarded to the
+    wrapped tokenizer.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            return self.tokenizer(*args, **kwargs)
+
+    def tokenize(self, *args, **kwargs):
+        with self._lock:
+            return self.tokenizer.tokenize(*args, **kwargs)
+
+    def batch_decode(self, *args, **kwargs):
+        with self._lock:
+            return self.tokenizer.batch_decode(*args, **kwargs)
+
+    def decode(self, *args, **kwargs):
+        with self._lock:
+            return self.tokenizer.decode(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+
+def _spans(text: str, pattern: str, start: int, end: int) -> List[Tuple[int, int]]:
+    """Cut text[start:end] after each match of pattern, dropping blank spans."""
+    spans = []
+    for match in re.compile(pattern).finditer(text, start, end):
+        spans.append((start, match.end()))
+        start = match.end()
+    spans.append((start, end))
+    return [(s, e) for s, e in spans if text[s:e].strip()]
+
+
+def split_by_tokens(text: str, tokenizer, max_tokens: int) -> List[str]:
+    """Pack the sentences of text into chunks of at most max_tokens tokens.
+
+    Tokens are counted with the tokenizer of the translation model, from
+    the offsets of a single tokenization of the whole text when the
+    tokenizer is fast. Whole sentences are packed greedily. A sentence
+    longer than the budget is packed word by word, and a word longer than
+    the budget is cut into equal pieces.
+
+    Parameters
+    ----------
+    text: str
+        Text to be split.
+    tokenizer:
+        Tokenizer of the translation model.
+    max_tokens: int
+        Maximum number of tokens per chunk, special tokens included.
+
+    Returns
+    -------
+    List[str]
+        Chunks of text, in order.
+    """
+    budget = max(1, max_tokens - tokenizer.num_special_tokens_to_add())
+    if tokenizer.is_fast:
+        offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        token_starts = [start for start, end in offsets if end > start]
+
+        def count(spans):
+            return [
+                bisect.bisect_left(token_starts, e) - bisect.bisect_left(token_starts, s) for s, e in spans
+            ]
+    else:
+        def count(spans):
+            encoded = tokenizer([text[s:e] for s, e in spans], add_special_tokens=False)["input_ids"]
+            return [len(ids) for ids in encoded]
+
+    units = []
+    sentences = _spans(text, r"(?<=[.!?])\s+", 0, len(text))
+    for sentence, num_tokens in zip(sentences, count(sentences)):
+        if num_tokens <= budget:
+            units.append((sentence, num_tokens))
+            continue
+        words = _spans(text, r"\s+", *sentence)
+        for (s, e), num_tokens in zip(words, count(words)):
+            pieces = math.ceil(num_tokens / budget)
+            step = math.ceil((e - s) / pieces)
+            for i in range(s, e, step):
+                units.append(((i, min(i + step, e)), math.ceil(num_tokens / pieces)))
+
+    chunks = []
+    chunk_start, chunk_end, chunk_tokens = None, None, 0
+    for (s, e), num_tokens in units:
+        if chunk_start is not None and chunk_tokens + num_tokens > budget:
+            chunks.append(text[chunk_start:chunk_end].strip())
+            chunk_start = None
+        if chunk_start is None:
+            chunk_start, chunk_tokens = s, 0
+        chunk_end = e
+        chunk_tokens += num_tokens
+    if chunk_start is not None:
+        chunks.append(text[chunk_start:chunk_end].strip())
+    return chunks
+
+
+class RepetitionStopping(StoppingCriteria):
+    """Stop the sequences whose last tokens are an n-gram repeated in a loop.
+
+    A sequence is looping when it ends with a block of p tokens,
+    1 <= p <= max_period, repeated at least min_repeats times and over at
+    least MIN_LOOP_TOKENS tokens. Those sequences are stopped right away
+    instead of decoding up to the length limit, and flagged in fired.
+    """
+
+    def __init__(self, max_period: int, min_repeats: int, pad_token_id: Optional[int], eos_token_id: Optional[int]):
+        self.max_period = max_period
+        self.min_repeats = min_repeats
+        self.done_token_ids = [i for i in (pad_token_id, eos_token_id) if i is not None]
+        self.fired = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.fired is None:
+            self.fired = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        # The first token is the decoder start token
+        length = input_ids.shape[1] - 1
+        looping = torch.zeros_like(self.fired)
+        for period in range(1, self.max_period + 1):
+            span = period * max(self.min_repeats, math.ceil(MIN_LOOP_TOKENS / period))
+            if span > length:
+                break
+            tail = input_ids[:, -span:]
+            looping |= (tail[:, period:] == tail[:, :-period]).all(dim=1)
+        # Finished sequences are padded, padding is not a loop
+        for token_id in self.done_token_ids:
+            looping &= input_ids[:, -1] != token_id
+        self.fired |= looping
+        return looping
+
+
+def length_buckets(lengths: List[int], max_batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """Group sequence indices into batches of similar length.
+
+    Indices are sorted by length so that each batch needs little padding,
+    then cut greedily so that the padded size of a batch
+    (number of sequences * longest sequence) stays within max_batch_tokens.
+    A sequence longer than the budget gets a batch of its own.
+
+    Parameters
+    ----------
+    lengths: List[int]
+        Token length of each sequence.
+    max_batch_tokens: int
+        Maximum number of padded tokens per batch.
+    max_batch_size: int
+        Maximum number of sequences per batch.
+
+    Returns
+    -------
+    List[List[int]]
+        Indices into lengths, one list per batch.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    batch = []
+    for i in order:
+        # lengths are sorted, so lengths[i] is the longest of the batch
+        padded_size = (len(batch) + 1) * lengths[i]
+        if batch and (padded_size > max_batch_tokens or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def batched_generate(
+    model,
+    tokenizer,
+    texts: List[str],
+    device: torch.device,
+    max_batch_tokens: int = 4096,
+    max_batch_size: int = 32,
+    max_length: int = 512,
+    max_new_tokens_ratio: float = 0.0,
+    loop_max_period: int = 0,
+    loop_min_repeats: int = 4,
+    counters: Optional[Dict[str, int]] = None,
+) -> List[Optional[str]]:
+    """Translate texts with padded, length-bucketed generate calls.
+
+    With loop_max_period > 0, sequences that degenerate into a repeated
+    n-gram are stopped as soon as the loop is detected (see
+    RepetitionStopping) and their result is None.
+
+    Parameters
+    ----------
+    model:
+        Seq2seq translation model.
+    tokenizer:
+        Tokenizer of the translation model.
+    texts: List[str]
+        Texts to be translated.
+    device: torch.device
+        Device of the model.
+    max_batch_tokens: int
+        Maximum number of padded input tokens per generate call.
+    max_batch_size: int
+        Maximum number of texts per generate call.
+    max_length: int
+        Maximum length of the generated sequences.
+    max_new_tokens_ratio: float
+        Limit the generated tokens of a batch to this many times the
+        length of its longest input (plus a small margin), 0 to always
+        allow max_length.
+    loop_max_period: int
+        Longest repeated n-gram stopped during decoding, 0 to disable.
+    loop_min_repeats: int
+        Minimum number of repeats of the n-gram.
+    counters: Optional[Dict[str, int]]
+        Incremented with the number of sequences, of their input tokens,
+        of sequences stopped in a loop, of decoding steps run and of
+        decoding steps allowed.
+
+    Returns
+    -------
+    List[Optional[str]]
+        Translated texts, in the same order as texts, None for the texts
+        stopped in a loop.
+    """
+    if counters is None:
+        counters = {}
+    for key in ["sequences", "input_tokens", "loops_stopped", "decode_steps", "decode_budget"]:
+        counters.setdefault(key, 0)
+    if not texts:
+        return []
+    lengths = [len(ids) for ids in tokenizer(texts)["input_ids"]]
+    results = [None] * len(texts)
+    for batch in length_buckets(lengths, max_batch_tokens, max_batch_size):
+        inputs = tokenizer(
+            [texts[i] for i in batch],
+            return_tensors="pt",
+            padding=True,
+        ).to(device)
+        max_new_tokens = max_length
+        if max_new_tokens_ratio > 0:
+            longest = max(lengths[i] for i in batch)
+            max_new_tokens = min(max_length, int(longest * max_new_tokens_ratio) + MAX_NEW_TOKENS_MARGIN)
+        stopping_criteria = StoppingCriteriaList()
+        repetition_stopping = None
+        if loop_max_period > 0:
+            repetition_stopping = RepetitionStopping(
+                loop_max_period, loop_min_repeats, tokenizer.pad_token_id, tokenizer.eos_token_id
+            )
+            stopping_criteria.append(repetition_stopping)
+        with torch.inference_mode():
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                stopping_criteria=stopping_criteria,
+            )
+        decoded = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        fired = [False] * len(batch)
+        if repetition_stopping is not None and repetition_stopping.fired is not None:
+            fired = repetition_stopping.fired.tolist()
+        for i, res, looping in zip(batch, decoded, fired):
+            results[i] = None if looping else res
+
+        counters["sequences"] += len(batch)
+        counters["input_tokens"] += sum(lengths[i] for i in batch)
+        counters["loops_stopped"] += sum(fired)
+        counters["decode_steps"] += outputs.shape[1] - 1
+        counters["decode_budget"] += max_new_tokens
+    return results
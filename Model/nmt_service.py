@@ -0,0 +1,294 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import torch
+
+from Model.nmt import batched_generate
+from Model.precision import autocast
+
+# Chunks of a document looked at when searching one of the batch length bucket
+SCAN_WINDOW = 64
+# Chunk latencies kept for the percentiles
+LATENCY_WINDOW = 10000
+
+
+def length_bucket(num_tokens: int) -> int:
+    """Bucket of chunks of similar length: 1, 2, 3-4, 5-8, ... tokens."""
+    return max(0, num_tokens - 1).bit_length()
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class _Chunk:
+    __slots__ = ("text", "length", "counters", "future", "submitted_at")
+
+    def __init__(self, text: str, length: int, counters: Dict[str, int]):
+        self.text = text
+        self.length = length
+        self.counters = counters
+        self.future = Future()
+        self.submitted_at = time.perf_counter()
+
+
+class NmtService:
+    """Translation model batches shared by every document being translated.
+
+    Callers submit the chunks of a document with translate() and block
+    until they are translated. A dispatcher thread keeps forming batches
+    from the chunks waiting at that moment, of every document. A batch
+    holds chunks of one target language and one length bucket, so that
+    little of it is padding. Languages take turns of at most
+    max_language_batches batches in a row, so that the model of a language
+    is not swapped out after every batch when only one fits in memory. The
+    slots of a batch are dealt round-robin to the documents that have such
+    chunks waiting, so a long document gets one slot per turn like a short
+    one and cannot starve it.
+
+    Batches are formed between generate calls: a batch runs until its
+    longest sequence is done, the next one takes the chunks that arrived
+    meanwhile.
+    """
+
+    def __init__(
+        self,
+        model_for: Callable[[str], Tuple[Any, Any, str]],
+        device: torch.device,
+        max_batch_tokens: int = 4096,
+        max_batch_size: int = 32,
+        max_wait_seconds: float = 0.01,
+        max_language_batches: int = 4,
+        precision: str = "fp32",
+        generate_kwargs: Optional[Dict[str, Any]] = None,
+        pin: Optional[Callable[[str], None]] = None,
+        unpin: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        Parameters
+        ----------
+        model_for: Callable[[str], Tuple[Any, Any, str]]
+            Model, tokenizer and model id of a target language.
+        device: torch.device
+            Device of the models.
+        max_batch_tokens: int
+            Maximum number of padded input tokens per batch.
+        max_batch_size: int
+            Maximum number of chunks per batch.
+        max_wait_seconds: float
+            Time the oldest waiting chunk waits for the batch to fill up.
+        max_language_batches: int
+            Maximum number of batches of one language in a row while other
+            languages have chunks waiting.
+        precision: str
+            Precision profile of the models, see Model.precision.
+        generate_kwargs: Optional[Dict[str, Any]]
+            Other arguments of batched_generate.
+        pin: Optional[Callable[[str], None]]
+            Called with the language of a translate() call before its
+            chunks are queued, to keep its model loaded, see
+            ModelRegistry.pin.
+        unpin: Optional[Callable[[str], None]]
+            Called once the chunks of that call are translated.
+        """
+        self.model_for = model_for
+        self.device = device
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.max_language_batches = max_language_batches
+        self.precision = precision
+        self.generate_kwargs = generate_kwargs or {}
+        self.pin = pin
+        self.unpin = unpin
+        self._cond = threading.Condition()
+        # language -> document key -> chunks waiting, least recently served first
+        self._pending: "OrderedDict[str, OrderedDict[Hashable, deque]]" = OrderedDict()
+        # Batches in a row of the language at the front of _pending
+        self._language_batches = 0
+        self._depth = 0
+        self.batches = 0
+        self.chunks = 0
+        self.slots = 0
+        self.input_tokens = 0
+        self.padded_tokens = 0
+        self.queue_seconds = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        threading.Thread(target=self._dispatch, name="nmt-service", daemon=True).start()
+
+    def translate(
+        self, language: str, texts: List[str], key: Optional[Hashable] = None
+    ) -> Tuple[List[Optional[str]], Dict[str, int]]:
+        """Translate texts in the shared batches.
+
+        Parameters
+        ----------
+        language: str
+            Target language.
+        texts: List[str]
+            Chunks to be translated.
+        key: Optional[Hashable]
+            Document the chunks belong to, the unit of fairness. Every
+            call is its own document by default.
+
+        Returns
+        -------
+        Tuple[List[Optional[str]], Dict[str, int]]
+            Translated chunks, None for the chunks stopped in a loop (see
+            batched_generate), and the counters of batched_generate for
+            these chunks: the decoding steps are those of the batches they
+            were part of.
+        """
+        counters = {name: 0 for name in ["sequences", "input_tokens", "loops_stopped", "decode_steps", "decode_budget"]}
+        if not texts:
+            return [], counters
+        if key is None:
+            key = object()
+        if self.pin is not None:
+            self.pin(language)
+        try:
+            _, tokenizer, _ = self.model_for(language)
+            lengths = [len(ids) for ids in tokenizer(texts)["input_ids"]]
+            chunks = [_Chunk(text, length, counters) for text, length in zip(texts, lengths)]
+            with self._cond:
+                queues = self._pending.setdefault(language, OrderedDict())
+                queues.setdefault(key, deque()).extend(chunks)
+                self._depth += len(chunks)
+                self._cond.notify()
+            return [chunk.future.result() for chunk in chunks], counters
+        finally:
+            if self.unpin is not None:
+                self.unpin(language)
+
+    def _next_batch(self) -> Tuple[str, List[_Chunk]]:
+        with self._cond:
+            while not self._depth:
+                self._cond.wait()
+            # Give the batch a chance to fill up, the oldest chunk waits at most max_wait_seconds
+            while self._depth < self.max_batch_size:
+                oldest = min(
+                    queue[0].submitted_at for queues in self._pending.values() for queue in queues.values()
+                )
+                timeout = oldest + self.max_wait_seconds - time.perf_counter()
+                if timeout <= 0:
+                    break
+                self._cond.wait(timeout)
+
+            language = next(iter(self._pending))
+            queues = self._pending[language]
+            # The least recently served document sets the length bucket
+            bucket = length_bucket(next(iter(queues.values()))[0].length)
+            batch = []
+            longest = 0
+            full = False
+            while not full:
+                served = False
+                for key in list(queues):
+                    queue = queues[key]
+                    chunk = next(
+                        (c for c in itertools.islice(queue, SCAN_WINDOW) if length_bucket(c.length) == bucket), None
+                    )
+                    if chunk is None:
+                        continue
+                    if batch and (len(batch) + 1) * max(longest, chunk.length) > self.max_batch_tokens:
+                        full = True
+                        break
+                    queue.remove(chunk)
+                    batch.append(chunk)
+                    longest = max(longest, chunk.length)
+                    served = True
+                    if queue:
+                        queues.move_to_end(key)
+                    else:
+                        del queues[key]
+                    if len(batch) >= self.max_batch_size:
+                        full = True
+                        break
+                full = full or not served
+            # The language keeps its turn until it is done or has had max_language_batches
+            self._language_batches += 1
+            if not queues:
+                del self._pending[language]
+                self._language_batches = 0
+            elif self._language_batches >= self.max_language_batches:
+                self._pending.move_to_end(language)
+                self._language_batches = 0
+            self._depth -= len(batch)
+        return language, batch
+
+    def _dispatch(self) -> None:
+        while True:
+            language, batch = self._next_batch()
+            start_time = time.perf_counter()
+            counters = {}
+            try:
+                model, tokenizer, _ = self.model_for(language)
+                with autocast(self.precision, self.device):
+                    outputs = batched_generate(
+                        model,
+                        tokenizer,
+                        [chunk.text for chunk in batch],
+                        self.device,
+                        max_batch_tokens=self.max_batch_tokens,
+                        max_batch_size=self.max_batch_size,
+                        counters=counters,
+                        **self.generate_kwargs,
+                    )
+            except Exception as e:
+                for chunk in batch:
+                    chunk.future.set_exception(e)
+                continue
+            end_time = time.perf_counter()
+
+            # Decoding steps are shared by the chunks of the batch, each caller counts them once
+            for chunk_counters in {id(chunk.counters): chunk.counters for chunk in batch}.values():
+                chunk_counters["decode_steps"] += counters["decode_steps"]
+                chunk_counters["decode_budget"] += counters["decode_budget"]
+            for chunk, output in zip(batch, outputs):
+                chunk.counters["sequences"] += 1
+                chunk.counters["input_tokens"] += chunk.length
+                chunk.counters["loops_stopped"] += output is None
+
+            with self._cond:
+                self.batches += 1
+                self.chunks += len(batch)
+                self.slots += self.max_batch_size
+                self.input_tokens += sum(chunk.length for chunk in batch)
+                self.padded_tokens += len(batch) * max(chunk.length for chunk in batch)
+                for chunk in batch:
+                    self.queue_seconds += start_time - chunk.submitted_at
+                    self._latencies.append(end_time - chunk.submitted_at)
+            for chunk, output in zip(batch, outputs):
+                chunk.future.set_result(output)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, batch fill and chunk latency since the service started.
+
+        fill_ratio is the share of the max_batch_size slots used,
+        padding_efficiency the share of real tokens in the padded batches.
+        The latency of a chunk goes from its submission to the end of its
+        batch, its percentiles are over the last LATENCY_WINDOW chunks.
+        """
+        with self._cond:
+            latencies = sorted(self._latencies)
+            return {
+                "queue_depth": self._depth,
+                "queue_depth_by_language": {
+                    language: sum(map(len, queues.values())) for language, queues in self._pending.items()
+                },
+                "batches": self.batches,
+                "chunks": self.chunks,
+                "mean_batch_size": self.chunks / self.batches if self.batches else 0.0,
+                "fill_ratio": self.chunks / self.slots if self.slots else 0.0,
+                "padding_efficiency": self.input_tokens / self.padded_tokens if self.padded_tokens else 0.0,
+                "mean_queue_seconds": self.queue_seconds / self.chunks if self.chunks else 0.0,
+                "latency_p50_seconds": _percentile(latencies, 0.5),
+                "latency_p90_seconds": _percentile(latencies, 0.9),
+                "latency_p99_seconds": _percentile(latencies, 0.99),
+            }
@@ -0,0 +1,212 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+def _line_key(points) -> Tuple[int, ...]:
+    return tuple(int(v) for point in points for v in point)
+
+
+def batched_readtext(
+    reader,
+    page_images: Sequence[np.ndarray],
+    crops: Sequence[Tuple[int, Sequence[int]]],
+    batch_size: int = 8,
+) -> List[List[str]]:
+    """Run EasyOCR on many crops with batched detection and per-page recognition.
+
+    The text detector runs on batches of crops padded with white to a
+    common size. The detected lines are then moved back to page
+    coordinates and every line of a page is recognized in a single
+    recognize call on the page image.
+
+    Parameters
+    ----------
+    reader: easyocr.Reader
+        EasyOCR reader.
+    page_images: Sequence[np.ndarray]
+        RGB page images.
+    crops: Sequence[Tuple[int, Sequence[int]]]
+        (page index, [x0, y0, x1, y1]) of each crop, in page pixels.
+    batch_size: int
+        Number of crops per detector call and recognizer batch size.
+
+    Returns
+    -------
+    List[List[str]]
+        Lines read in each crop, top to bottom, as readtext returns them.
+    """
+    # Detection: sort by size so that each batch needs little padding
+    order = sorted(
+        range(len(crops)),
+        key=lambda i: (crops[i][1][3] - crops[i][1][1]) * (crops[i][1][2] - crops[i][1][0]),
+    )
+    crop_lines = [([], []) for _ in crops]
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        images = [
+            page_images[crops[i][0]][crops[i][1][1]:crops[i][1][3], crops[i][1][0]:crops[i][1][2]]
+            for i in batch
+        ]
+        height = max(image.shape[0] for image in images)
+        width = max(image.shape[1] for image in images)
+        padded = np.full((len(images), height, width, 3), 255, dtype=np.uint8)
+        for j, image in enumerate(images):
+            padded[j, :image.shape[0], :image.shape[1]] = image
+        horizontal_list_agg, free_list_agg = reader.detect(padded, reformat=False)
+
+        for i, horizontal_list, free_list in zip(batch, horizontal_list_agg, free_list_agg):
+            x0, y0 = crops[i][1][0], crops[i][1][1]
+            for x_min, x_max, y_min, y_max in horizontal_list:
+                crop_lines[i][0].append([int(x_min) + x0, int(x_max) + x0, int(y_min) + y0, int(y_max) + y0])
+            for points in free_list:
+                crop_lines[i][1].append([[int(x) + x0, int(y) + y0] for x, y in points])
+
+    # Recognition: one call per page for the lines of all its crops
+    results = [[] for _ in crops]
+    for page_index, page_image in enumerate(page_images):
+        page_crops = [i for i, (index, _) in enumerate(crops) if index == page_index]
+        if not page_crops:
+            continue
+        height, width = page_image.shape[:2]
+        owners = {}
+        horizontal_list, free_list = [], []
+        for i in page_crops:
+            for x_min, x_max, y_min, y_max in crop_lines[i][0]:
+                # EasyOCR clamps the boxes to the image, do it first so that
+                # the returned boxes match the keys
+                box = [max(0, x_min), min(x_max, width), max(0, y_min), min(y_max, height)]
+                key = _line_key([[box[0], box[2]], [box[1], box[2]], [box[1], box[3]], [box[0], box[3]]])
+                if key not in owners:
+                    horizontal_list.append(box)
+                    owners[key] = []
+                if i not in owners[key]:
+                    owners[key].append(i)
+            for points in crop_lines[i][1]:
+                key = _line_key(points)
+                if key not in owners:
+                    free_list.append(points)
+                    owners[key] = []
+                if i not in owners[key]:
+                    owners[key].append(i)
+        if not horizontal_list and not free_list:
+            continue
+
+        for points, text, _ in reader.recognize(
+            page_image,
+            horizontal_list=horizontal_list,
+            free_list=free_list,
+            batch_size=batch_size,
+        ):
+            for i in owners.pop(_line_key(points), []):
+                results[i].append(text)
+    return results
+
+
+def assign_to_regions(boxes: np.ndarray, regions: np.ndarray) -> np.ndarray:
+    """Assign each box to the region containing its center.
+
+    When several regions contain the center (overlapping layout boxes),
+    the smallest one wins, so that every box is assigned at most once.
+
+    Parameters
+    ----------
+    boxes: np.ndarray
+        (n, 4) array of x0 y0 x1 y1.
+    regions: np.ndarray
+        (m, 4) array of x0 y0 x1 y1.
+
+    Returns
+    -------
+    np.ndarray
+        (n,) index of the region of each box, -1 if it lies in none.
+    """
+    if len(boxes) == 0 or len(regions) == 0:
+        return np.full(len(boxes), -1, dtype=np.int64)
+    centers_x = ((boxes[:, 0] + boxes[:, 2]) / 2)[:, None]
+    centers_y = ((boxes[:, 1] + boxes[:, 3]) / 2)[:, None]
+    inside = (
+        (centers_x >= regions[None, :, 0]) & (centers_x <= regions[None, :, 2])
+        & (centers_y >= regions[None, :, 1]) & (centers_y <= regions[None, :, 3])
+    )
+    areas = (regions[:, 2] - regions[:, 0]) * (regions[:, 3] - regions[:, 1])
+    masked_areas = np.where(inside, areas[None, :], np.inf)
+    assigned = np.argmin(masked_areas, axis=1)
+    assigned[~inside.any(axis=1)] = -1
+    return assigned
+
+
+def page_readtext(
+    reader,
+    page_images: Sequence[np.ndarray],
+    crops: Sequence[Tuple[int, Sequence[int]]],
+    batch_size: int = 8,
+) -> List[List[str]]:
+    """Run EasyOCR once per page and assign the lines to the crops.
+
+    Unlike batched_readtext, pixels shared by overlapping crops are only
+    read once: text lines are detected and recognized on the whole page,
+    then each line goes to the smallest crop containing its center.
+    Lines outside every crop are dropped.
+
+    Parameters
+    ----------
+    reader: easyocr.Reader
+        EasyOCR reader.
+    page_images: Sequence[np.ndarray]
+        RGB page images.
+    crops: Sequence[Tuple[int, Sequence[int]]]
+        (page index, [x0, y0, x1, y1]) of each crop, in page pixels.
+    batch_size: int
+        Number of pages per detector call and recognizer batch size.
+
+    Returns
+    -------
+    List[List[str]]
+        Lines assigned to each crop, top to bottom.
+    """
+    page_indices = sorted(set(index for index, _ in crops))
+
+    # Detection: pages of the same size go through the detector together
+    detections = {}
+    by_shape = {}
+    for index in page_indices:
+        by_shape.setdefault(page_images[index].shape, []).append(index)
+    for indices in by_shape.values():
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start:start + batch_size]
+            horizontal_list_agg, free_list_agg = reader.detect(
+                np.stack([page_images[index] for index in batch]), reformat=False
+            )
+            for index, horizontal_list, free_list in zip(batch, horizontal_list_agg, free_list_agg):
+                detections[index] = (horizontal_list, free_list)
+
+    results = [[] for _ in crops]
+    for index in page_indices:
+        horizontal_list, free_list = detections[index]
+        if not horizontal_list and not free_list:
+            continue
+        lines = reader.recognize(
+            page_images[index],
+            horizontal_list=horizontal_list,
+            free_list=free_list,
+            batch_size=batch_size,
+        )
+        if not lines:
+            continue
+
+        page_crops = [i for i, (crop_index, _) in enumerate(crops) if crop_index == index]
+        regions = np.array([crops[i][1] for i in page_crops], dtype=np.float32)
+        line_boxes = np.array(
+            [
+                [min(x for x, _ in points), min(y for _, y in points),
+                 max(x for x, _ in points), max(y for _, y in points)]
+                for points, _, _ in lines
+            ],
+            dtype=np.float32,
+        )
+        # Lines come back sorted top to bottom, so each crop keeps that order
+        for (_, text, _), region in zip(lines, assign_to_regions(line_boxes, regions)):
+            if region >= 0:
+                results[page_crops[region]].append(text)
+    return results
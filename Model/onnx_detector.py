@@ -0,0 +1,99 @@
+import sys
+from typing import Dict, List
+
+import numpy as np
+import onnxruntime as ort
+import torch
+
+OUTPUT_NAMES = ["boxes", "labels", "scores"]
+
+
+def export_onnx(model, output_path: str, opset_version: int = 17) -> None:
+    """Export the box-only layout model to ONNX.
+
+    The graph takes one (3, height, width) float image of any size and
+    includes the resizing, normalization and post-processing of the
+    model, so it returns the same boxes, labels and scores as the model.
+
+    Parameters
+    ----------
+    model:
+        Layout model returned by get_instance_segmentation_model with
+        box_only=True, with its checkpoint loaded.
+    output_path: str
+        Path of the ONNX file.
+    opset_version: int
+        ONNX opset of the graph.
+    """
+    model = model.eval().to("cpu", memory_format=torch.contiguous_format)
+    image = torch.rand(3, 1000, 773)
+    torch.onnx.export(
+        model,
+        ([image],),
+        output_path,
+        input_names=["image"],
+        output_names=OUTPUT_NAMES,
+        dynamic_axes={
+            "image": {1: "height", 2: "width"},
+            "boxes": {0: "detections"},
+            "labels": {0: "detections"},
+            "scores": {0: "detections"},
+        },
+        opset_version=opset_version,
+        # torchvision detection models only export with the TorchScript exporter
+        dynamo=False,
+    )
+
+
+class OnnxDetector:
+    """Run the exported layout model on ONNX Runtime.
+
+    Called like the torch model: a list of (3, height, width) image
+    tensors in, one dict of boxes, labels and scores tensors per image out.
+    """
+
+    def __init__(self, model_path: str, num_threads: int = 0, num_interop_threads: int = 0):
+        """
+        Parameters
+        ----------
+        model_path: str
+            Path of the file written by export_onnx.
+        num_threads: int
+            Intra-op threads of the session, 0 for the default.
+        num_interop_threads: int
+            Inter-op threads of the session, 0 for the default.
+        """
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = num_interop_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, images: List[torch.Tensor]) -> List[Dict[str, torch.Tensor]]:
+        predictions = []
+        for image in images:
+            image = np.ascontiguousarray(image.detach().cpu().numpy(), dtype=np.float32)
+            outputs = self.session.run(OUTPUT_NAMES, {"image": image})
+            predictions.append({
+                name: torch.from_numpy(output) for name, output in zip(OUTPUT_NAMES, outputs)
+            })
+        return predictions
+
+
+if __name__ == "__main__":
+    from Model.config import PipelineConfig
+    from Model.main import (
+        CATEGORIES2LABELS,
+        get_instance_segmentation_model,
+        get_layout_model_kwargs,
+        load_checkpoint,
+    )
+
+    config = PipelineConfig.from_env()
+    output_path = sys.argv[1] if len(sys.argv) > 1 else config.detector_onnx_path
+    model = get_instance_segmentation_model(
+        len(CATEGORIES2LABELS), box_only=True, **get_layout_model_kwargs(config)
+    )
+    load_checkpoint(model, config.model_path, box_only=True)
+    export_onnx(model, output_path)
+    print(f"Exported the layout model to {output_path}")
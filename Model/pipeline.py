@@ -0,0 +1,238 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+_END = object()
+
+
+class Stage:
+    """One step of a Pipeline.
+
+    Attributes
+    ----------
+    name: str
+        Name used in the statistics.
+    fn: Callable
+        Function applied to every item.
+    workers: int
+        Number of threads running fn.
+    ordered: bool
+        Process the items in the order of the source. Requires workers=1.
+    stop_if: Optional[Callable]
+        Predicate on the output of fn. When it is true, the items that
+        come after this one in the source are dropped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        workers: int = 1,
+        ordered: bool = False,
+        stop_if: Optional[Callable[[Any], bool]] = None,
+    ):
+        if ordered and workers != 1:
+            raise ValueError(f"Ordered stage {name} must have exactly one worker.")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.ordered = ordered
+        self.stop_if = stop_if
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+
+class Pipeline:
+    """Run items through a chain of stages connected by bounded queues.
+
+    Every stage runs on its own threads, so consecutive items overlap and
+    the throughput approaches the one of the slowest stage. Queues are
+    bounded by queue_size, a slow stage blocks the stages before it
+    instead of letting items pile up in memory.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 2, threaded: bool = True):
+        """
+        Parameters
+        ----------
+        stages: List[Stage]
+            Stages, in order.
+        queue_size: int
+            Maximum number of items waiting in front of each stage.
+        threaded: bool
+            Run the stages one after another in the caller thread instead.
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.threaded = threaded
+        self._lock = threading.Lock()
+        self._last_index = None
+        self._error = None
+        self._wall_seconds = 0.0
+
+    def stop_after(self, index: int) -> None:
+        """Drop every item that comes after index in the source."""
+        with self._lock:
+            if self._last_index is None or index < self._last_index:
+                self._last_index = index
+
+    def _dropped(self, index: int) -> bool:
+        last_index = self._last_index
+        return last_index is not None and index > last_index
+
+    def _process(self, stage: Stage, index: int, item: Any) -> Any:
+        start_time = time.perf_counter()
+        result = stage.fn(item)
+        with self._lock:
+            stage.busy_seconds += time.perf_counter() - start_time
+            stage.items += 1
+        if stage.stop_if is not None and stage.stop_if(result):
+            self.stop_after(index)
+        return result
+
+    def run(self, source: Iterable[Any]) -> Iterator[Any]:
+        """Run every item of source through the stages.
+
+        Yields
+        ------
+        Any
+            Outputs of the last stage, in the order of the source.
+        """
+        start_time = time.perf_counter()
+        try:
+            if self.threaded:
+                yield from self._run_threaded(source)
+            else:
+                yield from self._run_inline(source)
+        finally:
+            self._wall_seconds = time.perf_counter() - start_time
+
+    def _run_inline(self, source: Iterable[Any]) -> Iterator[Any]:
+        for index, item in enumerate(source):
+            if self._dropped(index):
+                break
+            for stage in self.stages:
+                item = self._process(stage, index, item)
+            yield item
+
+    def _run_threaded(self, source: Iterable[Any]) -> Iterator[Any]:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(source, queues[0]), daemon=True)]
+        for stage, in_queue, out_queue in zip(self.stages, queues[:-1], queues[1:]):
+            finished = [0]
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, in_queue, out_queue, finished),
+                    daemon=True,
+                ))
+        for thread in threads:
+            thread.start()
+
+        pending = {}
+        next_index = 0
+        done = False
+        try:
+            while not done:
+                entry = queues[-1].get()
+                if entry is _END:
+                    done = True
+                    break
+                index, item = entry
+                pending[index] = item
+                while next_index in pending:
+                    item = pending.pop(next_index)
+                    if self._error is None and not self._dropped(next_index):
+                        yield item
+                    next_index += 1
+        finally:
+            if not done:
+                # The caller stopped early: drop everything and let the
+                # threads run to the end of the queues
+                self.stop_after(-1)
+                while queues[-1].get() is not _END:
+                    pass
+            for thread in threads:
+                thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _feed(self, source: Iterable[Any], out_queue: queue.Queue) -> None:
+        try:
+            for index, item in enumerate(source):
+                if self._dropped(index) or self._error is not None:
+                    break
+                out_queue.put((index, item))
+        except Exception as e:
+            self._error = e
+        finally:
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+            out_queue.put(_END)
+
+    def _work(self, stage: Stage, in_queue: queue.Queue, out_queue: queue.Queue, finished: List[int]) -> None:
+        pending = {}
+        next_index = 0
+        while True:
+            start_time = time.perf_counter()
+            entry = in_queue.get()
+            with self._lock:
+                stage.wait_seconds += time.perf_counter() - start_time
+            if entry is _END:
+                # Let the other workers of the stage see the end as well
+                in_queue.put(_END)
+                with self._lock:
+                    finished[0] += 1
+                    last_worker = finished[0] == stage.workers
+                if last_worker:
+                    out_queue.put(_END)
+                return
+
+            if stage.ordered:
+                pending[entry[0]] = entry[1]
+                entries = []
+                while next_index in pending:
+                    entries.append((next_index, pending.pop(next_index)))
+                    next_index += 1
+            else:
+                entries = [entry]
+
+            for index, item in entries:
+                # After an error or past the stop point, only drain the queue
+                if self._error is not None or self._dropped(index):
+                    continue
+                try:
+                    result = self._process(stage, index, item)
+                except Exception as e:
+                    self._error = e
+                    self.stop_after(-1)
+                    continue
+                start_time = time.perf_counter()
+                out_queue.put((index, result))
+                with self._lock:
+                    stage.blocked_seconds += time.perf_counter() - start_time
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage statistics of the last run.
+
+        occupancy is the share of the wall-clock time the workers of the
+        stage spent processing items. wait_seconds is the time spent
+        waiting for input (starved) and blocked_seconds the time spent
+        waiting for room in the next queue (backpressure).
+        """
+        stats = {}
+        for stage in self.stages:
+            capacity = self._wall_seconds * stage.workers
+            stats[stage.name] = {
+                "workers": stage.workers,
+                "items": stage.items,
+                "busy_seconds": stage.busy_seconds,
+                "wait_seconds": stage.wait_seconds,
+                "blocked_seconds": stage.blocked_seconds,
+                "occupancy": stage.busy_seconds / capacity if capacity > 0 else 0.0,
+            }
+        return stats
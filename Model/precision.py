@@ -0,0 +1,68 @@
+import contextlib
+
+import torch
+
+PRECISIONS = ("fp32", "bf16", "int8")
+
+
+def prepare_model(model: torch.nn.Module, precision: str, device: torch.device) -> torch.nn.Module:
+    """Convert a model in eval mode to a precision profile.
+
+    fp32 and bf16 keep the fp32 weights, bf16 only changes how the model
+    is run (see autocast). int8 replaces the Linear layers by dynamically
+    quantized ones: int8 weights, activations quantized on the fly.
+    It is only available on CPU.
+
+    Parameters
+    ----------
+    model: torch.nn.Module
+        Model in eval mode.
+    precision: str
+        One of PRECISIONS.
+    device: torch.device
+        Device the model runs on.
+
+    Returns
+    -------
+    torch.nn.Module
+        The converted model.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision}, expected one of {PRECISIONS}.")
+    if precision != "int8":
+        return model
+    if device.type != "cpu":
+        raise ValueError("int8 dynamic quantization only runs on CPU.")
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def autocast(precision: str, device: torch.device):
+    """Context in which a model prepared for precision is run."""
+    if precision == "bf16":
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def _tensors(value):
+    if isinstance(value, torch.Tensor):
+        yield value
+    elif isinstance(value, (tuple, list)):
+        # Quantized Linear layers keep (weight, bias) packed in a tuple
+        for v in value:
+            yield from _tensors(v)
+
+
+def model_size_bytes(model: torch.nn.Module) -> int:
+    """Memory taken by the weights and buffers of model, quantized ones included.
+
+    Tied weights, such as shared embeddings, are counted once.
+    """
+    seen = set()
+    total = 0
+    for value in model.state_dict().values():
+        for tensor in _tensors(value):
+            key = id(tensor) if tensor.is_quantized else tensor.data_ptr()
+            if key not in seen:
+                seen.add(key)
+                total += tensor.element_size() * tensor.nelement()
+    return total
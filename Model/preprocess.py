@@ -0,0 +1,94 @@
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+
+class PageMeta(NamedTuple):
+    """Geometry of a page given to the layout detector.
+
+    Attributes
+    ----------
+    ratio: float
+        Detector pixels per page pixel, boxes are divided by it to go
+        back to the page image.
+    width: int
+        Width of the page image.
+    height: int
+        Height of the page image.
+    """
+    ratio: float
+    width: int
+    height: int
+
+
+def _count(counters: Optional[Dict[str, int]], num_bytes: int) -> None:
+    if counters is not None:
+        counters["allocations"] = counters.get("allocations", 0) + 1
+        counters["bytes"] = counters.get("bytes", 0) + num_bytes
+
+
+def preprocess_pages(
+    images: Sequence[np.ndarray],
+    device: torch.device,
+    target_height: int = 1000,
+    counters: Optional[Dict[str, int]] = None,
+) -> Tuple[List[torch.Tensor], List[PageMeta]]:
+    """Turn rendered RGB pages into the input tensors of the layout detector.
+
+    Every page is resized to target_height rows, keeping its aspect
+    ratio, directly into a shared uint8 buffer holding all the pages of
+    the same resized size. Each buffer is moved to the device as uint8
+    and converted once to a contiguous float tensor, in BGR order and
+    scaled to [0, 1] like the cv2 + ToTensor path the model was used
+    with. No PIL image or per-page float copy is created.
+
+    Parameters
+    ----------
+    images: Sequence[np.ndarray]
+        (height, width, 3) RGB uint8 page images.
+    device: torch.device
+        Device of the detector.
+    target_height: int
+        Height of the detector input.
+    counters: Optional[Dict[str, int]]
+        Incremented with the number and size of the page-sized buffers
+        allocated.
+
+    Returns
+    -------
+    Tuple[List[torch.Tensor], List[PageMeta]]
+        (3, h, w) float tensor of each page, views into one tensor per
+        group of same-size pages, and the geometry of each page.
+    """
+    list_meta = []
+    groups = {}
+    for index, image in enumerate(images):
+        height, width = image.shape[:2]
+        ratio = target_height / height
+        list_meta.append(PageMeta(ratio, width, height))
+        # Same rounding as cv2.resize(img, None, fx=ratio, fy=ratio)
+        size = (int(round(width * ratio)), int(round(height * ratio)))
+        groups.setdefault(size, []).append(index)
+
+    tensors = [None] * len(images)
+    for (width, height), indices in groups.items():
+        batch = np.empty((len(indices), height, width, 3), dtype=np.uint8)
+        _count(counters, batch.nbytes)
+        for slot, index in enumerate(indices):
+            cv2.resize(np.ascontiguousarray(images[index]), (width, height), dst=batch[slot])
+        batch = torch.from_numpy(batch)
+        if batch.device != torch.device(device):
+            batch = batch.to(device, non_blocking=True)
+            _count(counters, batch.nbytes)
+
+        inputs = torch.empty((len(indices), 3, height, width), dtype=torch.float32, device=device)
+        _count(counters, inputs.element_size() * inputs.nelement())
+        for channel in range(3):
+            # RGB to BGR while converting to float
+            inputs[:, channel].copy_(batch[..., 2 - channel])
+        inputs.div_(255)
+        for slot, index in enumerate(indices):
+            tensors[index] = inputs[slot]
+    return tensors, list_meta
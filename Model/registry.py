@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+from Model.precision import model_size_bytes
+
+
+class ModelRegistry:
+    """Translation models keyed by target language, loaded on first use.
+
+    Loaded models are kept from most to least recently used. When their
+    total size goes over memory_budget_bytes, the least recently used ones
+    are dropped until it fits again, and loaded again when next needed.
+    The model just loaded is never dropped, even alone over the budget,
+    and neither are the pinned ones: a language is pinned while it has
+    chunks waiting to be translated, so that taking turns with another
+    language does not reload its model every time. A document that is
+    using a dropped model keeps it until it is done with it.
+
+    Two threads asking for the same language wait for a single load,
+    languages that are already loaded are served meanwhile.
+    """
+
+    def __init__(
+        self,
+        model_names: Dict[str, str],
+        load: Callable[[str], Tuple[Any, Any]],
+        memory_budget_bytes: int = 0,
+    ):
+        """
+        Parameters
+        ----------
+        model_names: Dict[str, str]
+            Model name of each target language.
+        load: Callable[[str], Tuple[Any, Any]]
+            Loads the model and tokenizer of a model name.
+        memory_budget_bytes: int
+            Maximum total size of the loaded models, 0 for no limit.
+        """
+        self.model_names = dict(model_names)
+        self.load = load
+        self.memory_budget_bytes = memory_budget_bytes
+        self._lock = threading.Lock()
+        self._load_locks = {language: threading.Lock() for language in self.model_names}
+        # language -> (model, tokenizer, size in bytes), least recently used first
+        self._loaded: "OrderedDict[str, Tuple[Any, Any, int]]" = OrderedDict()
+        # language -> number of pins
+        self._pins: Dict[str, int] = {}
+        self._stats = {
+            language: {"hits": 0, "loads": 0, "evictions": 0, "load_seconds": 0.0, "bytes": 0}
+            for language in self.model_names
+        }
+
+    def get(self, language: str) -> Tuple[Any, Any, str]:
+        """Model, tokenizer and model name of language, loaded if needed."""
+        if language not in self.model_names:
+            raise ValueError(
+                f"No translation model for language {language}, "
+                f"choose one of {', '.join(self.model_names)}."
+            )
+        entry = self._hit(language)
+        if entry is None:
+            with self._load_locks[language]:
+                # Another thread may have loaded it while this one waited
+                entry = self._hit(language)
+                if entry is None:
+                    entry = self._load(language)
+        model, tokenizer, _ = entry
+        return model, tokenizer, self.model_names[language]
+
+    def pin(self, language: str) -> None:
+        """Keep the model of language loaded until unpin(), once loaded."""
+        with self._lock:
+            self._pins[language] = self._pins.get(language, 0) + 1
+
+    def unpin(self, language: str) -> None:
+        """Undo one pin(), the model can be dropped again once it has none."""
+        with self._lock:
+            self._pins[language] -= 1
+            if not self._pins[language]:
+                del self._pins[language]
+            evicted = self._evict()
+        if evicted:
+            print(f"Evicted the translation models of {', '.join(evicted)}")
+
+    def _hit(self, language: str):
+        with self._lock:
+            entry = self._loaded.get(language)
+            if entry is not None:
+                self._loaded.move_to_end(language)
+                self._stats[language]["hits"] += 1
+            return entry
+
+    def _load(self, language: str) -> Tuple[Any, Any, int]:
+        start_time = time.perf_counter()
+        model, tokenizer = self.load(self.model_names[language])
+        entry = (model, tokenizer, model_size_bytes(model))
+        seconds = time.perf_counter() - start_time
+        with self._lock:
+            self._loaded[language] = entry
+            stats = self._stats[language]
+            stats["loads"] += 1
+            stats["load_seconds"] += seconds
+            stats["bytes"] = entry[2]
+            evicted = self._evict()
+        print(
+            f"Loaded the {language} translation model {self.model_names[language]} in {seconds:.2f}s, "
+            f"{entry[2] / 2**20:.0f} MiB"
+            + (f", evicted {', '.join(evicted)}" if evicted else "")
+        )
+        return entry
+
+    def _evict(self):
+        evicted = []
+        if self.memory_budget_bytes <= 0:
+            return evicted
+        # Least recently used first, the most recently used one stays
+        for language in list(self._loaded)[:-1]:
+            if self.resident_bytes() <= self.memory_budget_bytes:
+                break
+            if language in self._pins:
+                continue
+            del self._loaded[language]
+            self._stats[language]["evictions"] += 1
+            evicted.append(language)
+        return evicted
+
+    def resident_bytes(self) -> int:
+        return sum(size for _, _, size in self._loaded.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Loaded and pinned languages, their total size, and per-language hits, loads, load time and evictions."""
+        with self._lock:
+            return {
+                "loaded": list(self._loaded),
+                "pinned": list(self._pins),
+                "resident_bytes": self.resident_bytes(),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "languages": {language: dict(stats) for language, stats in self._stats.items()},
+            }
@@ -0,0 +1,99 @@
+from typing import List
+
+
+def z_function(s: str) -> List[int]:
+    """Z-array of s: z[i] is the length of the longest common prefix of s and s[i:].
+
+    Linear time, z[0] is set to len(s).
+    """
+    n = len(s)
+    z = [0] * n
+    if n == 0:
+        return z
+    z[0] = n
+    left, right = 0, 0
+    for i in range(1, n):
+        if i < right:
+            z[i] = min(right - i, z[i - left])
+        while i + z[i] < n and s[z[i]] == s[i + z[i]]:
+            z[i] += 1
+        if i + z[i] > right:
+            left, right = i, i + z[i]
+    return z
+
+
+def _is_word(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+def _is_boundary(s: str, i: int) -> bool:
+    """Same test as the \\b of re at position i of s."""
+    before = i > 0 and _is_word(s[i - 1])
+    after = i < len(s) and _is_word(s[i])
+    return before != after
+
+
+def count_repeats(s: str, start: int, end: int) -> int:
+    """Count the non-overlapping occurrences of s[start:end] in s.
+
+    Occurrences are counted from left to right like re.finditer with
+    the pattern surrounded by \\b: they must start and end on a word
+    boundary.
+    """
+    pattern = s[start:end]
+    length = len(pattern)
+    # The separator never matches, so no Z value of the text goes past the pattern
+    z = z_function(pattern + "\x00" + s)
+    offset = length + 1
+    count = 0
+    position = 0
+    while position <= len(s) - length:
+        if (
+            z[offset + position] >= length
+            and _is_boundary(s, position)
+            and _is_boundary(s, position + length)
+        ):
+            count += 1
+            position += length
+        else:
+            position += 1
+    return count
+
+
+def has_repetition(s: str, min_length: int = 10, min_repeats: int = 15) -> bool:
+    """Detect a translation stuck in a loop.
+
+    Looks for a pattern of at least min_length characters, taken at the
+    start or in the middle of s, repeated at least min_repeats times.
+    Every occurrence of a pattern also contains its shorter prefixes, so
+    only the shortest candidate needs counting: the min_length characters
+    at the anchor, extended to the next word boundary, past a word or a
+    run of punctuation and spaces they cut. The whole check is linear in len(s).
+
+    Parameters
+    ----------
+    s: str
+        Translated text.
+    min_length: int
+        Minimum number of characters of the repeated pattern.
+    min_repeats: int
+        Minimum number of non-overlapping occurrences.
+
+    Returns
+    -------
+    bool
+        True if s contains such a repetition.
+    """
+    n = len(s)
+    if n < min_length * min_repeats:
+        return False
+    # Patterns starting at the beginning of s, then in its second half
+    for start, limit in ((0, n // 2), (n // 2 + 1, n - 1)):
+        end = start + min_length
+        while end < limit and not _is_boundary(s, end):
+            end += 1
+        if end > limit:
+            continue
+        if count_repeats(s, start, end) >= min_repeats:
+            return True
+    return False
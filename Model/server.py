@@ -0,0 +1,198 @@
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from Model.client import DEFAULT_ADDRESS, parse_address
+from Model.config import PipelineConfig
+from Model.main import TranslationLayoutRecovery
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return str(self.client_address or "unix")
+
+    def _send(self, code: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, self.server.model_server.health())
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/translate":
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            self._send(400, {"error": f"Invalid request: {e}"})
+            return
+        self._send(*self.server.model_server.submit(request))
+
+
+class ModelServer:
+    """Process owning the only TranslationLayoutRecovery of a host.
+
+    Web workers send translation requests over a Unix socket or HTTP
+    (see TranslationClient) instead of each loading the models. Requests
+    wait in a bounded queue and are translated by a pool of worker threads
+    sharing the models, each translate_pdf call keeping its own state.
+    Requests beyond the queue size are rejected with 503. The models are
+    loaded after the socket is open, /health reports "loading" until they
+    are ready.
+    """
+
+    def __init__(
+        self,
+        address: str = DEFAULT_ADDRESS,
+        queue_size: int = 8,
+        config: Optional[PipelineConfig] = None,
+        workers: int = 1,
+    ):
+        """
+        Parameters
+        ----------
+        address: str
+            unix:///path/to.sock or http://host:port to listen on.
+        queue_size: int
+            Maximum number of requests waiting for the pipeline.
+        config: Optional[PipelineConfig]
+            Configuration of the pipeline, from the environment by default.
+        workers: int
+            Number of documents translated at the same time.
+        """
+        self.address = address
+        self.config = config
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.workers = workers
+        self.model = None
+        self.status = "loading"
+        self.error = None
+        self._counters_lock = threading.Lock()
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.started_at = time.time()
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "error": self.error,
+            "queued": self.jobs.qsize(),
+            "busy": self.busy,
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "uptime_seconds": time.time() - self.started_at,
+            "load_stats": self.model.load_stats if self.model is not None else None,
+            "translation_models": self.model.translation_models.stats() if self.model is not None else None,
+            "nmt_service": (
+                self.model.nmt_service.stats()
+                if self.model is not None and self.model.nmt_service is not None
+                else None
+            ),
+            "detector_batching": (
+                self.model.detector_scheduler.stats()
+                if self.model is not None and self.model.detector_scheduler is not None
+                else None
+            ),
+        }
+
+    def submit(self, request: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Queue a translation request and wait for its result."""
+        missing = [key for key in ["input_path", "language", "output_file"] if key not in request]
+        if missing:
+            return 400, {"error": f"Missing {', '.join(missing)}"}
+        if self.status == "error":
+            return 503, {"error": f"Models failed to load: {self.error}"}
+        job = {"request": request, "done": threading.Event(), "result": None}
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            return 503, {"error": "Model server queue is full"}
+        job["done"].wait()
+        return job["result"]
+
+    def _load(self) -> None:
+        try:
+            self.model = TranslationLayoutRecovery(self.config)
+            self.status = "ok"
+        except Exception as e:
+            traceback.print_exc()
+            self.status, self.error = "error", str(e)
+        for _ in range(self.workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def _work(self) -> None:
+        while True:
+            job = self.jobs.get()
+            if self.model is None:
+                job["result"] = 503, {"error": f"Models failed to load: {self.error}"}
+                job["done"].set()
+                continue
+            with self._counters_lock:
+                self.busy += 1
+            try:
+                request = job["request"]
+                stats = self.model.translate_pdf(
+                    input_path=request["input_path"],
+                    language=request["language"],
+                    output_file=request["output_file"],
+                )
+                job["result"] = 200, {"stats": stats}
+                with self._counters_lock:
+                    self.processed += 1
+            except Exception as e:
+                traceback.print_exc()
+                job["result"] = 500, {"error": str(e)}
+                with self._counters_lock:
+                    self.failed += 1
+            finally:
+                with self._counters_lock:
+                    self.busy -= 1
+                job["done"].set()
+
+    def serve_forever(self) -> None:
+        scheme, location = parse_address(self.address)
+        if scheme == "unix":
+            if os.path.exists(location):
+                os.remove(location)
+            httpd = _UnixHTTPServer(location, _Handler)
+        else:
+            httpd = ThreadingHTTPServer(location, _Handler)
+        httpd.model_server = self
+        threading.Thread(target=self._load, daemon=True).start()
+        print(f"Model server listening on {self.address}")
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
+            if scheme == "unix" and os.path.exists(location):
+                os.remove(location)
+
+
+if __name__ == "__main__":
+    ModelServer(
+        address=os.getenv("TRANSLATION_SERVER_ADDRESS") or DEFAULT_ADDRESS,
+        queue_size=int(os.getenv("TRANSLATION_SERVER_QUEUE_SIZE") or 8),
+        workers=int(os.getenv("TRANSLATION_SERVER_WORKERS") or 1),
+    ).serve_forever()
@@ -0,0 +1,58 @@
+from typing import List, Sequence
+
+import fitz
+import numpy as np
+
+
+class PageText:
+    """Words of the embedded text layer of one PDF page.
+
+    Attributes
+    ----------
+    words: List[str]
+        Words in reading order (block, line, word) of the PDF.
+    boxes: np.ndarray
+        (n, 4) array of word boxes in PDF points, x0 y0 x1 y1.
+    num_chars: int
+        Total number of characters in the text layer.
+    """
+
+    def __init__(self, words: List[str], boxes: np.ndarray):
+        self.words = words
+        self.boxes = boxes
+        self.num_chars = sum(len(word) for word in words)
+        self._centers_x = (boxes[:, 0] + boxes[:, 2]) / 2
+        self._centers_y = (boxes[:, 1] + boxes[:, 3]) / 2
+
+    @classmethod
+    def from_page(cls, page: fitz.Page) -> "PageText":
+        flags = fitz.TEXTFLAGS_WORDS | fitz.TEXT_DEHYPHENATE
+        words = page.get_text("words", flags=flags)
+        boxes = np.array([w[:4] for w in words], dtype=np.float32).reshape(-1, 4)
+        return cls([w[4] for w in words], boxes)
+
+    def has_text(self, min_chars: int) -> bool:
+        """Whether the page is digital-born rather than scanned."""
+        return self.num_chars >= min_chars
+
+    def text_in_box(self, box: Sequence[float], scale: float) -> str:
+        """Return the words whose center lies inside box.
+
+        Parameters
+        ----------
+        box: Sequence[float]
+            x0 y0 x1 y1 in pixels of the rendered page.
+        scale: float
+            Pixels per PDF point, i.e. dpi / 72.
+
+        Returns
+        -------
+        str
+            Words joined by spaces, empty if the box has no text layer.
+        """
+        x0, y0, x1, y1 = (float(v) / scale for v in box)
+        inside = (
+            (self._centers_x >= x0) & (self._centers_x <= x1)
+            & (self._centers_y >= y0) & (self._centers_y <= y1)
+        )
+        return " ".join(self.words[i] for i in np.flatnonzero(inside))
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so that OCR spacing differences share one entry."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class TranslationMemory:
+    """Translation cache keyed on (normalized source, language, model id).
+
+    Lookups go through an in-process LRU first, then through an SQLite
+    table on disk. The disk table is bounded to max_entries rows, the least
+    recently used rows are evicted first. Every lookup that finds an entry,
+    in the LRU or on disk, marks its row as used.
+
+    Attributes
+    ----------
+    hits: int
+        Lookups served by the in-process LRU.
+    disk_hits: int
+        Lookups served by the SQLite table.
+    misses: int
+        Lookups that need the translation model.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 100000,
+        lru_size: int = 4096,
+    ):
+        """
+        Parameters
+        ----------
+        path: Optional[str]
+            SQLite file, None to keep the memory in-process only.
+        max_entries: int
+            Maximum number of rows kept on disk.
+        lru_size: int
+            Maximum number of entries kept in the in-process LRU.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.lru_size = lru_size
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_count = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translation_memory ("
+                "key TEXT PRIMARY KEY, language TEXT, model TEXT, "
+                "source TEXT, translation TEXT, last_used REAL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS translation_memory_last_used "
+                "ON translation_memory (last_used)"
+            )
+            self._conn.commit()
+            self._disk_count = self._conn.execute(
+                "SELECT COUNT(*) FROM translation_memory"
+            ).fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, language: str, model_id: str) -> str:
+        raw = "\0".join([model_id, language, normalize_text(text)])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str], language: str, model_id: str) -> Dict[str, str]:
+        """Look up several source texts.
+
+        Returns
+        -------
+        Dict[str, str]
+            Translation of every text found in the memory, keyed by text.
+        """
+        found = {}
+        disk_lookup = {}
+        # Keys found in the LRU, their disk rows are touched too
+        used = set()
+        with self._lock:
+            for text in texts:
+                key = self.make_key(text, language, model_id)
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[text] = self._lru[key]
+                    self.hits += 1
+                    used.add(key)
+                else:
+                    disk_lookup.setdefault(key, []).append(text)
+
+            if (disk_lookup or used) and self._conn is not None:
+                keys = list(disk_lookup)
+                rows = []
+                # Stay below the SQLite limit on the number of variables
+                for i in range(0, len(keys), 500):
+                    part = keys[i:i + 500]
+                    rows += self._conn.execute(
+                        "SELECT key, translation FROM translation_memory WHERE key IN "
+                        f"({','.join('?' * len(part))})",
+                        part,
+                    ).fetchall()
+                used.update(key for key, _ in rows)
+                # One update for every entry used, so that disk eviction follows the LRU hits as well
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE translation_memory SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in used],
+                )
+                self._conn.commit()
+                for key, translation in rows:
+                    for text in disk_lookup.pop(key):
+                        found[text] = translation
+                        self.disk_hits += 1
+                    self._remember(key, translation)
+
+            self.misses += sum(len(pending) for pending in disk_lookup.values())
+        return found
+
+    def put_many(self, pairs: Iterable[Tuple[str, str]], language: str, model_id: str) -> None:
+        """Store (source, translation) pairs."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, translation in pairs:
+                key = self.make_key(text, language, model_id)
+                self._remember(key, translation)
+                rows.append((key, language, model_id, normalize_text(text), translation, now))
+
+            if rows and self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO translation_memory VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._disk_count = self._conn.execute(
+                    "SELECT COUNT(*) FROM translation_memory"
+                ).fetchone()[0]
+                if self._disk_count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM translation_memory WHERE key IN ("
+                        "SELECT key FROM translation_memory ORDER BY last_used LIMIT ?)",
+                        (self._disk_count - self.max_entries,),
+                    )
+                    self._disk_count = self.max_entries
+                self._conn.commit()
+
+    def warm(self, corpus_path: str, model_ids: Dict[str, str]) -> int:
+        """Pre-load the memory from a JSON lines corpus.
+
+        Each line holds a {"source", "translation", "language"} object.
+        The entries are stored under the model id of their language in
+        model_ids, the languages missing from model_ids are skipped.
+
+        Returns
+        -------
+        int
+            Number of entries loaded.
+        """
+        by_language = {}
+        with open(corpus_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                by_language.setdefault(record["language"], []).append(
+                    (record["source"], record["translation"])
+                )
+        by_language = {language: pairs for language, pairs in by_language.items() if language in model_ids}
+        for language, pairs in by_language.items():
+            self.put_many(pairs, language, model_ids[language])
+        return sum(len(pairs) for pairs in by_language.values())
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "lru_entries": len(self._lru),
+            "disk_entries": self._disk_count,
+        }
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _remember(self, key: str, translation: str) -> None:
+        self._lru[key] = translation
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
@@ -0,0 +1,37 @@
+from typing import List
+
+import fitz
+
+MIN_FONT_SIZE = 4.0
+
+
+def redact_rects(page: fitz.Page, list_rects: List[fitz.Rect]) -> None:
+    """White out the text under the rectangles, keeping images and drawings."""
+    for rect in list_rects:
+        page.add_redact_annot(rect, fill=(1, 1, 1))
+    page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
+
+
+def insert_text_fit(
+    page: fitz.Page,
+    rect: fitz.Rect,
+    text: str,
+    fontname: str,
+    fontfile: str,
+    fontsize: float,
+) -> float:
+    """Write text inside rect, shrinking the font until it fits.
+
+    Returns
+    -------
+    float
+        Font size used, 0 if the text did not fit even at MIN_FONT_SIZE.
+    """
+    while fontsize >= MIN_FONT_SIZE:
+        # insert_textbox writes nothing and returns a negative value
+        # when the text overflows the rectangle
+        if page.insert_textbox(rect, text, fontsize=fontsize, fontname=fontname, fontfile=fontfile) >= 0:
+            return fontsize
+        fontsize *= 0.9
+    return 0.0
+
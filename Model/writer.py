@@ -0,0 +1,78 @@
+import io
+import time
+from typing import BinaryIO, Dict, Union
+
+import fitz
+import numpy as np
+from PIL import Image
+
+
+class DocumentWriter:
+    """Build the translated PDF in memory, page by page.
+
+    Pages are appended to a single open document as they are finished and
+    the document is written once, to a path or to a binary buffer, when
+    the writer is closed. No page goes through a temporary file.
+    """
+
+    def __init__(self, target: Union[str, BinaryIO], dpi: int, jpeg_quality: int = 75):
+        """
+        Parameters
+        ----------
+        target: Union[str, BinaryIO]
+            Output path or writable binary buffer.
+        dpi: int
+            Resolution of the raster pages, used to restore the page size.
+        jpeg_quality: int
+            JPEG quality of the raster pages.
+        """
+        self.target = target
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+        self.doc = fitz.open()
+        self.file_writes = 0
+        self.write_seconds = 0.0
+        self.num_bytes = 0
+
+    @property
+    def page_count(self) -> int:
+        return self.doc.page_count
+
+    def add_image_page(self, image: np.ndarray) -> None:
+        """Append a raster page, JPEG-encoded like PIL's PDF writer does."""
+        height, width = image.shape[:2]
+        buffer = io.BytesIO()
+        Image.fromarray(image).convert("RGB").save(buffer, "JPEG", quality=self.jpeg_quality)
+        page = self.doc.new_page(width=width * 72 / self.dpi, height=height * 72 / self.dpi)
+        page.insert_image(page.rect, stream=buffer.getvalue())
+
+    def add_pdf_page(self, source_doc: fitz.Document, page_number: int) -> fitz.Page:
+        """Append a copy of a page of source_doc and return it for editing."""
+        self.doc.insert_pdf(source_doc, from_page=page_number, to_page=page_number)
+        return self.doc[-1]
+
+    def close(self) -> None:
+        """Write the document to the target."""
+        start_time = time.perf_counter()
+        try:
+            self.doc.subset_fonts()
+        except ImportError:
+            # Subsetting needs fontTools, the full fonts are embedded otherwise
+            pass
+        data = self.doc.tobytes(garbage=3, deflate=True)
+        self.doc.close()
+        if isinstance(self.target, (str, bytes)) or hasattr(self.target, "__fspath__"):
+            with open(self.target, "wb") as f:
+                f.write(data)
+            self.file_writes += 1
+        else:
+            self.target.write(data)
+        self.num_bytes = len(data)
+        self.write_seconds += time.perf_counter() - start_time
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "file_writes": self.file_writes,
+            "write_seconds": self.write_seconds,
+            "bytes": self.num_bytes,
+        }
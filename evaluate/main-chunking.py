@@ -0,0 +1,63 @@
+import sys
+from typing import List
+
+import fitz
+import numpy as np
+from transformers import AutoTokenizer
+
+from Model.nmt import split_by_tokens
+
+
+def split_by_chars(text: str, text_limit_length: int = 450) -> List[str]:
+    """Character-based splitter used by _split_text before split_by_tokens."""
+    if len(text) < text_limit_length:
+        return [text]
+
+    sentences = text.rstrip().split(". ")
+    sentences = [s + ". " for s in sentences[:-1]] + sentences[-1:]
+    result = []
+    current_text = ""
+    for sentence in sentences:
+        if len(current_text) + len(sentence) < text_limit_length:
+            current_text += sentence
+        else:
+            if current_text:
+                result.append(current_text)
+            while len(sentence) >= text_limit_length:
+                result.append(sentence[:text_limit_length - 1])
+                sentence = sentence[text_limit_length - 1:].lstrip()
+            current_text = sentence
+    if current_text:
+        result.append(current_text)
+    return result
+
+
+def report(name, list_chunks, tokenizer, model_max_length=512):
+    chunks = [chunk for chunks in list_chunks for chunk in chunks]
+    lengths = np.array([len(ids) for ids in tokenizer(chunks)["input_ids"]])
+    print(
+        f"{name}: {len(chunks) / len(list_chunks):.2f} chunks per block, "
+        f"{lengths.mean():.1f} tokens per chunk (max {lengths.max()}), "
+        f"{(lengths > model_max_length).sum()} chunks over {model_max_length} tokens"
+    )
+
+
+if __name__=="__main__":
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "1711.07064-1-4.pdf"
+    tokenizer = AutoTokenizer.from_pretrained("VietAI/envit5-translation")
+    with fitz.open(input_path) as doc:
+        # Text blocks of the text layer stand in for the layout boxes
+        texts = [
+            " ".join(block[4].split())
+            for page in doc for block in page.get_text("blocks") if block[4].strip()
+        ]
+    # Merged paragraphs give the splitters long blocks to work on
+    texts += [" ".join(texts[i:i + 4]) for i in range(0, len(texts), 4)]
+
+    report("split by 450 characters", [split_by_chars(text) for text in texts], tokenizer)
+    for max_tokens in [128, 200, 256]:
+        report(
+            f"split by {max_tokens} tokens",
+            [split_by_tokens(text, tokenizer, max_tokens) for text in texts],
+            tokenizer,
+        )
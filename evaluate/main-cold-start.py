@@ -0,0 +1,47 @@
+import time
+
+import torch
+import torchvision
+from torchvision.models.detection import MaskRCNN_ResNet50_FPN_Weights
+from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
+from torchvision.models.detection.mask_rcnn import MaskRCNNPredictor
+
+from Model.config import PipelineConfig
+from Model.main import CATEGORIES2LABELS, TranslationLayoutRecovery, get_instance_segmentation_model, load_checkpoint
+
+
+def legacy_detector(config):
+    """Construction used before load_checkpoint: COCO weights, then the checkpoint."""
+    num_classes = len(CATEGORIES2LABELS)
+    model = torchvision.models.detection.maskrcnn_resnet50_fpn(weights=MaskRCNN_ResNet50_FPN_Weights.DEFAULT)
+    in_features = model.roi_heads.box_predictor.cls_score.in_features
+    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
+    in_features_mask = model.roi_heads.mask_predictor.conv5_mask.in_channels
+    model.roi_heads.mask_predictor = MaskRCNNPredictor(in_features_mask, 256, num_classes)
+    checkpoint = torch.load(config.model_path, map_location="cpu")
+    model.load_state_dict(checkpoint["model"])
+    return model.eval()
+
+
+def offline_detector(config):
+    model = get_instance_segmentation_model(len(CATEGORIES2LABELS))
+    return load_checkpoint(model, config.model_path).eval()
+
+
+if __name__=="__main__":
+    config = PipelineConfig(device="cpu")
+    for name, build in [("legacy", legacy_detector), ("offline", offline_detector)]:
+        start_time = time.perf_counter()
+        model = build(config)
+        print(f"{name} layout model: {time.perf_counter() - start_time:.2f}s")
+
+    # Same outputs: the checkpoint overwrites every tensor
+    image = [torch.rand(3, 1000, 773)]
+    with torch.inference_mode():
+        legacy, offline = legacy_detector(config)(image)[0], offline_detector(config)(image)[0]
+    print("same boxes:", legacy["boxes"].shape == offline["boxes"].shape
+          and torch.allclose(legacy["boxes"], offline["boxes"], atol=1e-3))
+
+    start_time = time.perf_counter()
+    obj = TranslationLayoutRecovery(config)
+    print(f"TranslationLayoutRecovery(): {time.perf_counter() - start_time:.2f}s, {obj.load_stats}")
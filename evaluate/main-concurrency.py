@@ -0,0 +1,64 @@
+import dataclasses
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+
+from Model.config import PipelineConfig
+from Model.main import TranslationLayoutRecovery
+
+
+def translate(model, content, language):
+    """Translate the PDF content, return the text of the output pages and the NMT counters."""
+    output = io.BytesIO()
+    stats = model.translate_pdf(content, language, output)
+    with fitz.open(stream=output.getvalue(), filetype="pdf") as doc:
+        texts = [page.get_text() for page in doc]
+    return texts, stats
+
+
+if __name__=="__main__":
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "1711.07064-1-4.pdf"
+    languages = (sys.argv[2] if len(sys.argv) > 2 else "vi,ja").split(",")
+    num_threads = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    rounds = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+
+    # Vector output to compare the translated text, and no translation
+    # memory so that every call runs the translation model
+    config = dataclasses.replace(PipelineConfig.from_env(), output_mode="vector", use_translation_memory=False)
+    model = TranslationLayoutRecovery(config)
+    with open(input_path, "rb") as f:
+        content = f.read()
+
+    start_time = time.perf_counter()
+    references = {language: translate(model, content, language) for language in languages}
+    sequential_seconds = time.perf_counter() - start_time
+
+    # Languages interleaved, so that documents of different languages run side by side
+    requests = languages * rounds
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        results = list(executor.map(lambda language: translate(model, content, language), requests))
+    concurrent_seconds = time.perf_counter() - start_time
+
+    def chunk_counters(stats):
+        # Decoding steps are those of the shared batches, they depend on the other documents
+        return {key: value for key, value in stats["nmt"].items() if key not in ("decode_steps", "decode_budget")}
+
+    mismatches = 0
+    for language, (texts, stats) in zip(requests, results):
+        reference_texts, reference_stats = references[language]
+        if (
+            stats["language"] != language
+            or texts != reference_texts
+            or chunk_counters(stats) != chunk_counters(reference_stats)
+        ):
+            mismatches += 1
+            print(f"{language}: output differs from the sequential translation")
+    print(
+        f"sequential: {len(languages) / sequential_seconds:.3f} documents/sec | "
+        f"{num_threads} threads: {len(requests) / concurrent_seconds:.3f} documents/sec | "
+        f"{len(requests) - mismatches}/{len(requests)} outputs identical to the sequential ones"
+    )
@@ -0,0 +1,75 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+import numpy as np
+import torch
+from torchvision.ops import box_iou
+
+from Model.batching import BatchScheduler
+from Model.config import PipelineConfig
+from Model.main import CATEGORIES2LABELS, get_instance_segmentation_model, get_layout_model_kwargs, load_checkpoint
+from Model.preprocess import preprocess_pages
+
+
+def run(detect, requests, num_threads):
+    """Detect the page batches of requests from num_threads threads, return the boxes and pages/sec."""
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        predictions = list(executor.map(detect, requests))
+    elapsed = time.perf_counter() - start_time
+    boxes = [p["boxes"][p["scores"] >= config.layout_score_threshold] for batch in predictions for p in batch]
+    return boxes, sum(map(len, requests)) / elapsed
+
+
+def mean_iou(reference_boxes, boxes):
+    """Mean IoU of each reference box with its best match, 0 when it has none."""
+    ious = []
+    for reference, other in zip(reference_boxes, boxes):
+        if len(reference) == 0:
+            continue
+        if len(other) == 0:
+            ious += [0.0] * len(reference)
+        else:
+            ious += box_iou(reference, other).max(dim=1).values.tolist()
+    return sum(ious) / len(ious) if ious else 1.0
+
+
+if __name__=="__main__":
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "1711.07064-1-4.pdf"
+    num_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    device = torch.device("cpu")
+    config = PipelineConfig(device="cpu")
+    config.setup_torch()
+
+    model = get_instance_segmentation_model(len(CATEGORIES2LABELS), box_only=True, **get_layout_model_kwargs(config))
+    model = load_checkpoint(model, config.model_path, box_only=True).eval()
+
+    def detect(images):
+        with torch.inference_mode():
+            return model(images)
+
+    with fitz.open(input_path) as doc:
+        images = []
+        for page in doc:
+            pix = page.get_pixmap(dpi=config.dpi, alpha=False)
+            images.append(np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3))
+    inputs, _ = preprocess_pages(images, device)
+    # Short documents: each request carries 1 to 3 pages
+    sizes = [1 + i % 3 for i in range(4 * num_threads)]
+    requests = [[inputs[(i + j) % len(inputs)] for j in range(size)] for i, size in enumerate(sizes)]
+    detect(requests[0])  # warm-up
+
+    reference_boxes, pages_per_sec = run(detect, requests, num_threads)
+    print(f"one forward pass per request: {pages_per_sec:.2f} pages/sec")
+    for max_wait_ms in [5, 20, 50]:
+        scheduler = BatchScheduler(detect, max_batch_size=config.detector_max_batch_size, max_wait_seconds=max_wait_ms / 1000)
+        boxes, pages_per_sec = run(scheduler, requests, num_threads)
+        stats = scheduler.stats()
+        print(
+            f"shared batches, {max_wait_ms} ms wait: {pages_per_sec:.2f} pages/sec, "
+            f"{stats['mean_batch_size']:.1f} pages per batch (max {stats['max_batch_size']}), "
+            f"{stats['mean_queue_seconds'] * 1000:.1f} ms mean queueing delay, "
+            f"box IoU vs per-request {mean_iou(reference_boxes, boxes):.3f}"
+        )
@@ -0,0 +1,60 @@
+import sys
+import time
+
+import fitz
+import numpy as np
+import torch
+
+from Model.config import PipelineConfig
+from Model.main import CATEGORIES2LABELS, get_instance_segmentation_model, load_checkpoint
+from Model.preprocess import preprocess_pages
+
+
+def load_model(config, box_only, **kwargs):
+    model = get_instance_segmentation_model(len(CATEGORIES2LABELS), box_only=box_only, **kwargs)
+    return load_checkpoint(model, config.model_path, box_only=box_only).eval()
+
+
+def time_model(model, inputs, repeats=3):
+    """Return the seconds per page and the predictions of the last run."""
+    with torch.inference_mode():
+        model(inputs[:1])  # warm-up
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            predictions = model(inputs)
+    return (time.perf_counter() - start_time) / (repeats * len(inputs)), predictions
+
+
+def kept_boxes(predictions, threshold=0.7):
+    return [p["boxes"][p["scores"] >= threshold] for p in predictions]
+
+
+if __name__=="__main__":
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "1711.07064-1-4.pdf"
+    config = PipelineConfig(device="cpu")
+    config.setup_torch()
+    with fitz.open(input_path) as doc:
+        images = []
+        for page in doc.pages(0, min(4, doc.page_count)):
+            pix = page.get_pixmap(dpi=config.dpi, alpha=False)
+            images.append(np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3))
+    inputs, _ = preprocess_pages(images, torch.device("cpu"))
+
+    mask_time, mask_predictions = time_model(load_model(config, box_only=False), inputs)
+    print(f"mask mode: {mask_time * 1000:.0f} ms/page")
+    for post_nms_top_n in [1000, 500, 300, 100]:
+        model = load_model(
+            config,
+            box_only=True,
+            rpn_pre_nms_top_n_test=post_nms_top_n,
+            rpn_post_nms_top_n_test=post_nms_top_n,
+        )
+        box_time, box_predictions = time_model(model, inputs)
+        same = all(
+            a.shape == b.shape and torch.allclose(a, b, atol=1e-3)
+            for a, b in zip(kept_boxes(mask_predictions), kept_boxes(box_predictions))
+        )
+        print(
+            f"box mode, {post_nms_top_n} proposals: {box_time * 1000:.0f} ms/page, "
+            f"saves {(mask_time - box_time) * 1000:.0f} ms/page, same boxes: {same}"
+        )
@@ -0,0 +1,54 @@
+import time
+
+import torch
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+from Model.nmt import batched_generate
+
+
+SENTENCES = [
+    "The dominant sequence transduction models are based on complex recurrent or convolutional neural networks that include an encoder and a decoder.",
+    "The best performing models also connect the encoder and decoder through an attention mechanism.",
+    "We propose a new simple network architecture, the Transformer, based solely on attention mechanisms.",
+    "Experiments on two machine translation tasks show these models to be superior in quality.",
+    "Recurrent models typically factor computation along the symbol positions of the input and output sequences.",
+    "Attention mechanisms have become an integral part of compelling sequence modeling and transduction models in various tasks.",
+    "In this work we propose the Transformer, a model architecture eschewing recurrence.",
+    "The Transformer allows for significantly more parallelization.",
+]
+
+
+def per_chunk_loop(model, tokenizer, texts, device):
+    """Translation loop used by _translate before batching."""
+    results = []
+    for t in texts:
+        inputs = tokenizer(t, return_tensors="pt").input_ids.to(device)
+        with torch.inference_mode():
+            outputs = model.generate(inputs, max_length=512)
+        results.append(tokenizer.decode(outputs[0], skip_special_tokens=True))
+    return results
+
+
+if __name__=="__main__":
+    model_name = "VietAI/envit5-translation"
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device).eval()
+
+    # A page batch with ~30 text blocks
+    texts = (SENTENCES * 4)[:30]
+
+    start_time = time.time()
+    per_chunk_loop(model, tokenizer, texts, device)
+    loop_time = time.time() - start_time
+
+    for max_batch_tokens in [1024, 2048, 4096, 8192]:
+        start_time = time.time()
+        batched_generate(model, tokenizer, texts, device, max_batch_tokens=max_batch_tokens)
+        batched_time = time.time() - start_time
+        print(
+            f"max_batch_tokens={max_batch_tokens}: "
+            f"{len(texts) / batched_time:.2f} sentences/sec batched vs "
+            f"{len(texts) / loop_time:.2f} sentences/sec per chunk "
+            f"(x{loop_time / batched_time:.2f})"
+        )
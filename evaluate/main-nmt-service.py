@@ -0,0 +1,60 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+import torch
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+from Model.nmt import SharedTokenizer, batched_generate, split_by_tokens
+from Model.nmt_service import NmtService
+
+
+def run(translate, documents):
+    """Translate the documents concurrently, return the seconds each one took and the total."""
+    def timed(chunks):
+        start_time = time.perf_counter()
+        translate(chunks)
+        return time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(documents)) as executor:
+        seconds = list(executor.map(timed, documents))
+    return seconds, time.perf_counter() - start_time
+
+
+if __name__=="__main__":
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "1711.07064-1-4.pdf"
+    num_short = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    device = torch.device("cpu")
+    model_name = "VietAI/envit5-translation"
+    tokenizer = SharedTokenizer(AutoTokenizer.from_pretrained(model_name))
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device).eval()
+
+    with fitz.open(input_path) as doc:
+        texts = [
+            " ".join(block[4].split())
+            for page in doc for block in page.get_text("blocks") if block[4].strip()
+        ]
+    chunks = [chunk for text in texts for chunk in split_by_tokens(text, tokenizer, 200)]
+    # One long document submitted first, then short ones of a few chunks
+    documents = [chunks * 4] + [chunks[i * 4:(i + 1) * 4] for i in range(num_short)]
+
+    seconds, total = run(lambda chunks: batched_generate(model, tokenizer, chunks, device), documents)
+    print(
+        f"own batches: {sum(map(len, documents)) / total:.2f} chunks/sec, long document {seconds[0]:.1f}s, "
+        f"short documents {max(seconds[1:]):.1f}s at most"
+    )
+
+    for max_wait_ms in [5, 10, 50]:
+        service = NmtService(
+            lambda language: (model, tokenizer, model_name), device, max_wait_seconds=max_wait_ms / 1000
+        )
+        seconds, total = run(lambda chunks: service.translate("vi", chunks), documents)
+        stats = service.stats()
+        print(
+            f"shared service, {max_wait_ms} ms wait: {sum(map(len, documents)) / total:.2f} chunks/sec, "
+            f"long document {seconds[0]:.1f}s, short documents {max(seconds[1:]):.1f}s at most, "
+            f"fill ratio {stats['fill_ratio']:.0%}, {stats['padding_efficiency']:.0%} real tokens, "
+            f"chunk latency p50 {stats['latency_p50_seconds']:.2f}s p99 {stats['latency_p99_seconds']:.2f}s"
+        )
@@ -0,0 +1,41 @@
+import os
+import time
+
+import easyocr
+import numpy as np
+from PIL import Image
+
+from Model.ocr import batched_readtext
+
+
+def split_crops(image, num_rows=4):
+    """Cut an image into horizontal bands, like the text blocks of a page."""
+    height, width = image.shape[:2]
+    step = height // num_rows
+    return [[0, i * step, width, min((i + 1) * step, height)] for i in range(num_rows)]
+
+
+if __name__=="__main__":
+    testset_path = "testset"
+    reader = easyocr.Reader(['en'])
+    page_images = [
+        np.array(Image.open(os.path.join(testset_path, name)).convert("RGB"))
+        for name in sorted(os.listdir(testset_path))
+    ]
+    crops = [(i, box) for i, image in enumerate(page_images) for box in split_crops(image)]
+
+    # Former loop: readtext on one crop at a time
+    start_time = time.time()
+    for page_index, (x0, y0, x1, y1) in crops:
+        reader.readtext(page_images[page_index][y0:y1, x0:x1])
+    loop_time = time.time() - start_time
+    print(f"readtext loop: {len(crops) / loop_time:.2f} crops/sec")
+
+    for batch_size in [1, 4, 8, 16]:
+        start_time = time.time()
+        batched_readtext(reader, page_images, crops, batch_size=batch_size)
+        batched_time = time.time() - start_time
+        print(
+            f"batched_readtext batch_size={batch_size}: "
+            f"{len(crops) / batched_time:.2f} crops/sec (x{loop_time / batched_time:.2f})"
+        )
@@ -0,0 +1,45 @@
+import sys
+import time
+
+import easyocr
+import fitz
+import numpy as np
+from PIL import Image
+
+from Model.ocr import batched_readtext, page_readtext
+
+
+def two_column_crops(image, num_rows=6, overlap=40):
+    """Overlapping text blocks of a two-column paper, like Mask R-CNN outputs."""
+    height, width = image.shape[:2]
+    step = height // num_rows
+    crops = []
+    for x0, x1 in [(0, width // 2 + overlap), (width // 2 - overlap, width)]:
+        for i in range(num_rows):
+            crops.append([x0, max(i * step - overlap, 0), x1, min((i + 1) * step + overlap, height)])
+    return crops
+
+
+if __name__=="__main__":
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else "1711.07064-1-4.pdf"
+    reader = easyocr.Reader(['en'])
+    with fitz.open(pdf_path) as doc:
+        page_images = []
+        for page in doc:
+            pix = page.get_pixmap(dpi=300, alpha=False)
+            page_images.append(np.array(Image.frombytes("RGB", (pix.width, pix.height), pix.samples)))
+    crops = [(i, box) for i, image in enumerate(page_images) for box in two_column_crops(image)]
+
+    start_time = time.time()
+    crop_results = batched_readtext(reader, page_images, crops)
+    crop_time = time.time() - start_time
+
+    start_time = time.time()
+    page_results = page_readtext(reader, page_images, crops)
+    page_time = time.time() - start_time
+
+    crop_lines = sum(len(lines) for lines in crop_results)
+    page_lines = sum(len(lines) for lines in page_results)
+    print(f"Per-crop OCR: {len(page_images) / crop_time:.3f} pages/sec, {crop_lines} lines read")
+    print(f"Page OCR: {len(page_images) / page_time:.3f} pages/sec, {page_lines} lines read")
+    print(f"Speedup: x{crop_time / page_time:.2f}")
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+
+import fitz
+import numpy as np
+import torch
+
+from Model.config import PipelineConfig
+from Model.main import CATEGORIES2LABELS, get_instance_segmentation_model, get_layout_model_kwargs, load_checkpoint
+from Model.onnx_detector import OnnxDetector, export_onnx
+from Model.preprocess import preprocess_pages
+
+
+def check_parity(torch_predictions, onnx_predictions, threshold=0.7, atol=1e-2):
+    """Compare the detections kept by _detect_layout, page by page."""
+    for page, (a, b) in enumerate(zip(torch_predictions, onnx_predictions)):
+        keep_a, keep_b = a["scores"] >= threshold, b["scores"] >= threshold
+        assert keep_a.sum() == keep_b.sum(), f"page {page}: {keep_a.sum()} vs {keep_b.sum()} boxes"
+        assert torch.equal(a["labels"][keep_a], b["labels"][keep_b]), f"page {page}: labels differ"
+        assert torch.allclose(a["boxes"][keep_a], b["boxes"][keep_b], atol=atol), f"page {page}: boxes differ"
+        assert torch.allclose(a["scores"][keep_a], b["scores"][keep_b], atol=atol), f"page {page}: scores differ"
+
+
+def pages_per_sec(model, inputs, repeats=3):
+    with torch.inference_mode():
+        model(inputs[:1])  # warm-up
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            predictions = model(inputs)
+    return repeats * len(inputs) / (time.perf_counter() - start_time), predictions
+
+
+if __name__=="__main__":
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "1711.07064-1-4.pdf"
+    config = PipelineConfig(device="cpu")
+    config.setup_torch()
+
+    model = get_instance_segmentation_model(len(CATEGORIES2LABELS), box_only=True, **get_layout_model_kwargs(config))
+    load_checkpoint(model, config.model_path, box_only=True).eval()
+    if not os.path.exists(config.detector_onnx_path):
+        export_onnx(model, config.detector_onnx_path)
+    onnx_model = OnnxDetector(config.detector_onnx_path, config.num_threads, config.num_interop_threads)
+
+    with fitz.open(input_path) as doc:
+        images = []
+        for page in doc.pages(0, min(4, doc.page_count)):
+            pix = page.get_pixmap(dpi=config.dpi, alpha=False)
+            images.append(np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3))
+    inputs, _ = preprocess_pages(images, torch.device("cpu"))
+
+    torch_speed, torch_predictions = pages_per_sec(model, inputs)
+    onnx_speed, onnx_predictions = pages_per_sec(onnx_model, inputs)
+    check_parity(torch_predictions, onnx_predictions)
+    print(f"parity OK on {len(inputs)} pages")
+    print(
+        f"eager PyTorch: {torch_speed:.2f} pages/sec, ONNX Runtime: {onnx_speed:.2f} pages/sec "
+        f"(x{onnx_speed / torch_speed:.2f})"
+    )
@@ -0,0 +1,89 @@
+import sys
+import time
+
+import fitz
+import numpy as np
+import torch
+from torchvision.ops import box_iou
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+from evaluate.src.utils.metric import Metric
+from Model.config import PipelineConfig
+from Model.main import CATEGORIES2LABELS, get_instance_segmentation_model, get_layout_model_kwargs, load_checkpoint
+from Model.nmt import batched_generate
+from Model.precision import PRECISIONS, autocast, model_size_bytes, prepare_model
+from Model.preprocess import preprocess_pages
+
+
+SENTENCES = [
+    "The dominant sequence transduction models are based on complex recurrent or convolutional neural networks that include an encoder and a decoder.",
+    "The best performing models also connect the encoder and decoder through an attention mechanism.",
+    "We propose a new simple network architecture, the Transformer, based solely on attention mechanisms.",
+    "Experiments on two machine translation tasks show these models to be superior in quality.",
+    "Recurrent models typically factor computation along the symbol positions of the input and output sequences.",
+    "Attention mechanisms have become an integral part of compelling sequence modeling and transduction models in various tasks.",
+    "In this work we propose the Transformer, a model architecture eschewing recurrence.",
+    "The Transformer allows for significantly more parallelization.",
+]
+
+
+def run_nmt(precision, device):
+    model_name = "VietAI/envit5-translation"
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device).eval()
+    model = prepare_model(model, precision, device)
+    with autocast(precision, device):
+        batched_generate(model, tokenizer, SENTENCES[:1], device)  # warm-up
+        start_time = time.perf_counter()
+        outputs = batched_generate(model, tokenizer, SENTENCES, device)
+    return outputs, (time.perf_counter() - start_time) / len(SENTENCES), model_size_bytes(model)
+
+
+def run_detector(precision, config, inputs, device):
+    model = get_instance_segmentation_model(len(CATEGORIES2LABELS), box_only=True, **get_layout_model_kwargs(config))
+    model = prepare_model(load_checkpoint(model, config.model_path, box_only=True).eval(), precision, device)
+    with torch.inference_mode(), autocast(precision, device):
+        model(inputs[:1])  # warm-up
+        start_time = time.perf_counter()
+        predictions = model(inputs)
+    boxes = [p["boxes"][p["scores"] >= config.layout_score_threshold].float() for p in predictions]
+    return boxes, (time.perf_counter() - start_time) / len(inputs), model_size_bytes(model)
+
+
+def mean_iou(reference_boxes, boxes):
+    """Mean IoU of each reference box with its best match, 0 when it has none."""
+    ious = []
+    for reference, other in zip(reference_boxes, boxes):
+        if len(reference) == 0:
+            continue
+        if len(other) == 0:
+            ious += [0.0] * len(reference)
+        else:
+            ious += box_iou(reference, other).max(dim=1).values.tolist()
+    return sum(ious) / len(ious) if ious else 1.0
+
+
+if __name__=="__main__":
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "1711.07064-1-4.pdf"
+    device = torch.device("cpu")
+    config = PipelineConfig(device="cpu")
+    config.setup_torch()
+    with fitz.open(input_path) as doc:
+        images = []
+        for page in doc.pages(0, min(4, doc.page_count)):
+            pix = page.get_pixmap(dpi=config.dpi, alpha=False)
+            images.append(np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3))
+    inputs, _ = preprocess_pages(images, device)
+
+    reference_texts, reference_boxes = None, None
+    for precision in PRECISIONS:
+        texts, chunk_time, nmt_bytes = run_nmt(precision, device)
+        boxes, page_time, detector_bytes = run_detector(precision, config, inputs, device)
+        if reference_texts is None:
+            reference_texts, reference_boxes = texts, boxes
+        bleu = np.mean([Metric.calculate_bleu_score(r, t) for r, t in zip(reference_texts, texts)])
+        print(
+            f"{precision}: envit5 {nmt_bytes / 2**20:.0f} MiB, {chunk_time * 1000:.0f} ms/chunk, "
+            f"BLEU vs fp32 {bleu:.3f} | layout model {detector_bytes / 2**20:.0f} MiB, "
+            f"{page_time * 1000:.0f} ms/page, box IoU vs fp32 {mean_iou(reference_boxes, boxes):.3f}"
+        )
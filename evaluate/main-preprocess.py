@@ -0,0 +1,75 @@
+import sys
+import time
+import tracemalloc
+
+import cv2
+import fitz
+import numpy as np
+import torch
+from PIL import Image
+from torch.profiler import ProfilerActivity, profile
+from torchvision.transforms import transforms
+
+from Model.preprocess import preprocess_pages
+
+
+# Buffers smaller than this are not page-sized, they are not counted
+MIN_BYTES = 2**20
+
+
+def legacy_preprocess(images, device):
+    """Per-page preprocessing used by _detect_layout before preprocess_pages."""
+    transform = transforms.Compose([transforms.ToPILImage(), transforms.ToTensor()])
+    tensors, rats = [], []
+    for image in images:
+        ori_img = np.array(image)
+        img = ori_img[:, :, ::-1].copy()
+        rat = 1000 / img.shape[0]
+        img = cv2.resize(img, None, fx=rat, fy=rat)
+        tensors.append(transform(img).to(device))
+        rats.append(rat)
+    return tensors, rats
+
+
+def measure(fn, images, device):
+    """Return the seconds, numpy peak bytes and torch page-sized allocations of fn."""
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        outputs = fn(images, device)
+    elapsed = time.perf_counter() - start_time
+    _, numpy_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    torch_allocations = sum(
+        1 for event in prof.events() if event.cpu_memory_usage >= MIN_BYTES
+    )
+    return outputs, elapsed, numpy_peak, torch_allocations
+
+
+if __name__=="__main__":
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "1711.07064-1-4.pdf"
+    device = torch.device("cpu")
+    with fitz.open(input_path) as doc:
+        pixmaps = [page.get_pixmap(dpi=300, alpha=False) for page in doc.pages(0, min(8, doc.page_count))]
+    pil_images = [Image.frombytes("RGB", (pix.width, pix.height), pix.samples) for pix in pixmaps]
+    arrays = [
+        np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3) for pix in pixmaps
+    ]
+
+    (legacy, _), legacy_time, legacy_peak, legacy_torch = measure(legacy_preprocess, pil_images, device)
+    counters = {}
+    (batched, list_meta), batched_time, batched_peak, batched_torch = measure(
+        lambda images, device: preprocess_pages(images, device, counters=counters), arrays, device
+    )
+
+    max_diff = max(float((a - b).abs().max()) for a, b in zip(legacy, batched))
+    print(f"{len(arrays)} pages, max difference {max_diff:.4f}")
+    print(
+        f"legacy:  {legacy_time * 1000:.1f} ms, numpy peak {legacy_peak / 2**20:.1f} MiB, "
+        f"{legacy_torch} page-sized torch allocations (+ PIL images)"
+    )
+    print(
+        f"batched: {batched_time * 1000:.1f} ms, numpy peak {batched_peak / 2**20:.1f} MiB, "
+        f"{batched_torch} page-sized torch allocations, "
+        f"{counters['allocations']} buffers / {counters['bytes'] / 2**20:.1f} MiB counted"
+    )
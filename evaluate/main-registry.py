@@ -0,0 +1,39 @@
+import sys
+import time
+
+import torch
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+from Model.config import NMT_MODELS
+from Model.nmt import batched_generate
+from Model.registry import ModelRegistry
+
+
+def load(model_name):
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name).eval()
+    return model, AutoTokenizer.from_pretrained(model_name)
+
+
+if __name__=="__main__":
+    # Budget in MiB, the default only fits one of the two models at a time
+    budget_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    device = torch.device("cpu")
+
+    start_time = time.perf_counter()
+    registry = ModelRegistry(NMT_MODELS, load, memory_budget_bytes=budget_mb * 2**20)
+    print(f"startup: {time.perf_counter() - start_time:.3f}s, no model loaded")
+
+    for language in ["vi", "vi", "ja", "ja", "vi"]:
+        start_time = time.perf_counter()
+        model, tokenizer, _ = registry.get(language)
+        get_seconds = time.perf_counter() - start_time
+        translated = batched_generate(model, tokenizer, ["The Transformer allows for more parallelization."], device)
+        print(
+            f"{language}: get {get_seconds:.2f}s, {translated[0]!r}, "
+            f"loaded {registry.stats()['loaded']} {registry.resident_bytes() / 2**20:.0f} MiB"
+        )
+    for language, stats in registry.stats()["languages"].items():
+        print(
+            f"{language}: {stats['loads']} loads ({stats['load_seconds']:.2f}s), "
+            f"{stats['hits']} hits, {stats['evictions']} evictions"
+        )
@@ -0,0 +1,75 @@
+import random
+import re
+import time
+
+from Model.repetition import has_repetition
+
+
+WORDS = (
+    "the model attention layer encoder decoder sequence network training data "
+    "results table figure propose method performance translation"
+).split()
+
+
+def repeated_substring(s: str) -> bool:
+    """Detector used by TranslationLayoutRecovery before has_repetition."""
+    n = len(s)
+    for i in range(10, n // 2 + 1):
+        pattern = s[:i]
+        matches = [match for match in re.finditer(rf'\b{re.escape(pattern)}\b', s)]
+        if len(matches) >= 15:
+            return True
+    for i in range(n // 2 + 11, n):
+        pattern = s[n // 2 + 1:i]
+        matches = [match for match in re.finditer(rf'\b{re.escape(pattern)}\b', s)]
+        if len(matches) >= 15:
+            return True
+    return False
+
+
+def normal_text(length: int, rng: random.Random) -> str:
+    text = ""
+    while len(text) < length:
+        text += rng.choice(WORDS) + " "
+    return text[:length]
+
+
+def looping_text(length: int, rng: random.Random) -> str:
+    prefix = normal_text(length // 4, rng)
+    loop = " ".join(rng.choice(WORDS) for _ in range(3)) + " "
+    return (prefix + loop * length)[:length]
+
+
+def punctuated_text(length: int, rng: random.Random) -> str:
+    """Looping text whose loop ends with punctuation and double spaces."""
+    prefix = normal_text(length // 4, rng)
+    loop = " ".join(rng.choice(WORDS) for _ in range(2)) + rng.choice(["!! ", ".  ", ", ", "?!  "])
+    return (prefix + loop * length)[:length]
+
+
+def time_detector(detector, texts, repeats=3):
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        results = [detector(text) for text in texts]
+    return (time.perf_counter() - start_time) / (repeats * len(texts)), results
+
+
+if __name__=="__main__":
+    rng = random.Random(0)
+    for length in [100, 500, 1000, 2000, 5000]:
+        for kind, make in [("normal", normal_text), ("looping", looping_text), ("punct", punctuated_text)]:
+            texts = [make(length, rng) for _ in range(5)]
+            old_time, old_results = time_detector(repeated_substring, texts, repeats=1)
+            new_time, new_results = time_detector(has_repetition, texts)
+            agree = sum(a == b for a, b in zip(old_results, new_results))
+            print(
+                f"{length:5d} chars {kind:8s}: "
+                f"_repeated_substring {old_time * 1000:9.2f} ms, "
+                f"has_repetition {new_time * 1000:7.3f} ms "
+                f"(x{old_time / new_time:.0f}), agree {agree}/{len(texts)}"
+            )
+
+    # Loops of punctuation and spaces, the pattern must run past them to a word boundary
+    texts = ["xin chào!! " * 20, "hello world.  " * 20, "a,  b.  " * 40, "the cat - the dog; " * 20]
+    for text in texts:
+        print(f"{text[:20]!r:24s}: _repeated_substring {repeated_substring(text)}, has_repetition {has_repetition(text)}")